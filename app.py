@@ -3,18 +3,49 @@
 Flask backend server for LLAMA LLM Chat Interface
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, Response, stream_with_context, abort, g
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 import os
-import json
+import time
+import json_codec
 from llama_client import LlamaClient
+from conversation_store import create_conversation_store
+from static_assets import StaticAssets
+from compression import Compressor, DecompressRequestMiddleware
+from metrics import REGISTRY, CONTENT_TYPE, HTTP_REQUEST_SECONDS, HTTP_RESPONSES, HTTP_IN_FLIGHT
+
+class CodecJSONProvider(JSONProvider):
+    """Route jsonify and request.get_json through json_codec (orjson when installed)"""
+
+    def dumps(self, obj, **kwargs):
+        return json_codec.dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return json_codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand the encoded bytes straight to the response instead of going through str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(json_codec.dumps(obj), mimetype="application/json")
 
 app = Flask(__name__)
+app.json = CodecJSONProvider(app)
 CORS(app)
 
+# Clients may gzip/zstd large request bodies; large JSON responses are compressed on the way out
+http_compressor = Compressor()
+app.wsgi_app = DecompressRequestMiddleware(app.wsgi_app, http_compressor)
+
 # Global client instance
 llama_client = None
 
+# Conversations are kept server-side so the browser only sends the new message
+conversation_store = create_conversation_store()
+
+# Frontend files are read, fingerprinted and compressed once at startup
+static_assets = StaticAssets(os.path.join(app.root_path, 'frontend'))
+
 def get_llama_client():
     """Get or create LLAMA client instance"""
     global llama_client
@@ -22,15 +53,121 @@ def get_llama_client():
         llama_client = LlamaClient()
     return llama_client
 
+def warm_up():
+    """Create the client and fetch a token once, before worker processes are forked"""
+    client = get_llama_client()
+    client.get_access_token()
+    client.token_provider.prepare_for_fork()
+
+def resolve_conversation(data):
+    """Return (conversation_id, history) for a chat request, or (None, None) if the ID is unknown.
+
+    Requests without a conversation_id start a new conversation, seeded with
+    conversation_history when the client sends one.
+    """
+    conversation_id = data.get('conversation_id')
+    if conversation_id:
+        history = conversation_store.get_messages(conversation_id)
+        if history is None:
+            return None, None
+        return conversation_id, history
+    
+    history = data.get('conversation_history', [])
+    return conversation_store.create(history), history
+
+def conversation_not_found():
+    return jsonify({
+        "status": "error",
+        "code": "conversation_not_found",
+        "message": "Conversation not found or expired"
+    }), 404
+
+def serve_asset(filename):
+    result = static_assets.respond(filename, request.headers.get('Accept-Encoding'),
+                                   request.headers.get('If-None-Match'))
+    if result is None:
+        abort(404)
+    status, body, headers = result
+    return Response(body, status=status, headers=headers)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    """Record latency and status; for streamed replies this is the time to the first byte"""
+    if 'request_started' in g:
+        # The route pattern keeps label cardinality bounded
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - g.request_started)
+        HTTP_RESPONSES.labels(endpoint, response.status_code).inc()
+    return response
+
+@app.teardown_request
+def finish_request(error=None):
+    if g.pop('request_started', None) is not None:
+        HTTP_IN_FLIGHT.dec()
+
+def client_stats_samples():
+    """Scrape-time gauges from the client's own counters (pool, caches, tokens, compression)"""
+    client = llama_client
+    if client is None:
+        return
+    pool = client.get_pool_stats()
+    yield "llama_pool_hit_rate", "Share of upstream requests served on a reused connection", {}, pool["hit_rate"]
+    tokens = client.get_token_metrics()
+    yield "llama_token_refreshes", "Access token refreshes since start", {}, tokens["refreshes"]
+    yield "llama_token_refresh_failures", "Failed access token refreshes since start", {}, tokens["refresh_failures"]
+    cache = client.get_cache_stats()
+    if cache:
+        yield "llama_response_cache_hit_rate", "Response cache hit rate", {}, cache["hit_rate"]
+    coalescing = client.get_coalescing_stats()
+    if coalescing:
+        yield ("llama_coalesced_requests", "Requests that shared an identical in-flight upstream call", {},
+               coalescing["followers"] + coalescing["stream_followers"])
+    for direction, stats in (("upstream_request", client.get_compression_stats()),
+                             ("response", http_compressor.get_stats())):
+        compress = stats["compress"]
+        yield ("llama_compression_bytes_saved", "Bytes saved by body compression",
+               {"direction": direction}, compress["bytes_saved"])
+        yield ("llama_compression_cpu_seconds", "CPU seconds spent compressing bodies",
+               {"direction": direction}, compress["cpu_seconds"])
+
+REGISTRY.add_collector(client_stats_samples)
+
+@app.after_request
+def compress_response(response):
+    """Compress JSON responses above the size threshold for clients that accept it"""
+    if (response.is_streamed or response.direct_passthrough or response.status_code < 200
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers
+            or response.mimetype != 'application/json'):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = http_compressor.negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    compressed = http_compressor.compress(response.get_data(), encoding)
+    if compressed is not None:
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        # The encoded bytes differ from the identity body, so a strong validator no longer holds;
+        # a weak one still matches If-None-Match, which is compared weakly
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+    return response
+
 @app.route('/')
 def index():
     """Serve the main HTML file"""
-    return send_from_directory('frontend', 'index.html')
+    return serve_asset('index.html')
 
 @app.route('/<path:filename>')
 def serve_static(filename):
     """Serve static files from frontend directory"""
-    return send_from_directory('frontend', filename)
+    return serve_asset(filename)
 
 @app.route('/api/test-connection', methods=['POST'])
 def test_connection():
@@ -65,7 +202,6 @@ def chat():
     try:
         data = request.get_json()
         message = data.get('message', '').strip()
-        conversation_history = data.get('conversation_history', [])
         
         if not message:
             return jsonify({
@@ -73,13 +209,23 @@ def chat():
                 "message": "Message cannot be empty"
             }), 400
         
+        conversation_id, conversation_history = resolve_conversation(data)
+        if conversation_id is None:
+            return conversation_not_found()
+        
         client = get_llama_client()
         result = client.send_chat_message(message, conversation_history)
         
         if result["status"] == "success":
+            conversation_store.append(
+                conversation_id,
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": result["message"]}
+            )
             return jsonify({
                 "status": "success",
-                "message": result["message"]
+                "message": result["message"],
+                "conversation_id": conversation_id
             })
         else:
             return jsonify({
@@ -93,6 +239,77 @@ def chat():
             "message": f"Chat request failed: {str(e)}"
         }), 500
 
+def sse_event(data):
+    """Format a dict as a Server-Sent Events frame"""
+    return b"data: " + json_codec.dumps(data) + b"\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream a chat reply from LLAMA LLM as Server-Sent Events"""
+    try:
+        data = request.get_json()
+        message = data.get('message', '').strip()
+        
+        if not message:
+            return jsonify({
+                "status": "error",
+                "message": "Message cannot be empty"
+            }), 400
+        
+        conversation_id, conversation_history = resolve_conversation(data)
+        if conversation_id is None:
+            return conversation_not_found()
+        
+        client = get_llama_client()
+        
+        def generate():
+            for event in client.stream_chat_message(message, conversation_history):
+                if event["status"] == "delta":
+                    yield sse_event({"status": "delta", "content": event["content"]})
+                    continue
+                if event["status"] == "success":
+                    conversation_store.append(
+                        conversation_id,
+                        {"role": "user", "content": message},
+                        {"role": "assistant", "content": event["message"]}
+                    )
+                yield sse_event({
+                    "status": event["status"],
+                    "message": event["message"],
+                    "conversation_id": conversation_id
+                })
+        
+        return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # stop reverse proxies from buffering the stream
+            "X-Conversation-Id": conversation_id
+        })
+            
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Chat request failed: {str(e)}"
+        }), 500
+
+@app.route('/api/conversations/<conversation_id>', methods=['GET'])
+def get_conversation(conversation_id):
+    """Get the stored messages of a conversation"""
+    messages = conversation_store.get_messages(conversation_id)
+    if messages is None:
+        return conversation_not_found()
+    return jsonify({
+        "status": "success",
+        "conversation_id": conversation_id,
+        "messages": messages
+    })
+
+@app.route('/api/conversations/<conversation_id>', methods=['DELETE'])
+def delete_conversation(conversation_id):
+    """Forget a stored conversation"""
+    if not conversation_store.delete(conversation_id):
+        return conversation_not_found()
+    return jsonify({"status": "success"})
+
 @app.route('/api/models', methods=['GET'])
 def get_models():
     """Get available models from LLAMA LLM service"""
@@ -101,10 +318,16 @@ def get_models():
         result = client.get_available_models()
         
         if result["status"] == "success":
-            return jsonify({
+            response = jsonify({
                 "status": "success",
                 "models": result["models"]
             })
+            # Browsers reuse the catalog until the client cache would refetch it, then revalidate with a 304
+            response.set_etag(result["etag"])
+            response.cache_control.private = True
+            response.cache_control.max_age = result["max_age"]
+            response.cache_control.must_revalidate = True
+            return response.make_conditional(request)
         else:
             return jsonify({
                 "status": "error",
@@ -126,6 +349,11 @@ def health_check():
         "version": "1.0.0"
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Metrics in Prometheus text exposition format (per process)"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -148,8 +376,11 @@ if __name__ == '__main__':
     print("🔧 API endpoints:")
     print("   - POST /api/test-connection")
     print("   - POST /api/chat")
+    print("   - POST /api/chat/stream")
+    print("   - GET/DELETE /api/conversations/<id>")
     print("   - GET  /api/models")
     print("   - GET  /api/health")
+    print("   - GET  /api/metrics")
     print("=" * 50)
     
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Async (aiohttp) backend server for LLAMA LLM Chat Interface
+
+Serves the same routes as app.py, but awaits upstream I/O instead of holding a
+thread per request, so one process can keep thousands of chats in flight.
+"""
+
+import asyncio
+import json
+import os
+
+from aiohttp import web
+
+import json_codec
+from async_llama_client import AsyncLlamaClient
+from conversation_store import create_conversation_store, SQLiteConversationStore
+from static_assets import StaticAssets
+from config import ASYNC_SERVER_HOST, ASYNC_SERVER_PORT, ASYNC_SERVER_MAX_CONCURRENCY, SERVER_BACKLOG
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend')
+
+routes = web.RouteTableDef()
+
+# Conversations are kept server-side so the browser only sends the new message
+conversation_store = create_conversation_store()
+
+# Frontend files are read, fingerprinted and compressed once at startup
+static_assets = StaticAssets(FRONTEND_DIR)
+
+
+async def store_call(method, *args):
+    """Call a conversation store method, off the event loop if it does disk I/O"""
+    if isinstance(conversation_store, SQLiteConversationStore):
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+
+def get_llama_client(request) -> AsyncLlamaClient:
+    return request.app['llama_client']
+
+
+def error_response(message, status, **extra):
+    return web.json_response({"status": "error", "message": message, **extra}, status=status)
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except json.JSONDecodeError:
+        return {}
+
+
+async def resolve_conversation(data):
+    """Return (conversation_id, history) for a chat request, or (None, None) if the ID is unknown"""
+    conversation_id = data.get('conversation_id')
+    if conversation_id:
+        history = await store_call(conversation_store.get_messages, conversation_id)
+        if history is None:
+            return None, None
+        return conversation_id, history
+
+    history = data.get('conversation_history', [])
+    return await store_call(conversation_store.create, history), history
+
+
+def conversation_not_found():
+    return error_response("Conversation not found or expired", 404, code="conversation_not_found")
+
+
+def serve_asset(request, filename):
+    result = static_assets.respond(filename, request.headers.get('Accept-Encoding'),
+                                   request.headers.get('If-None-Match'))
+    if result is None:
+        raise web.HTTPNotFound()
+    status, body, headers = result
+    return web.Response(body=body if status == 200 else None, status=status, headers=headers)
+
+
+@routes.get('/')
+async def index(request):
+    """Serve the main HTML file"""
+    return serve_asset(request, 'index.html')
+
+
+async def serve_static(request):
+    """Serve static files from frontend directory"""
+    if request.match_info['filename'].startswith('api/'):
+        raise web.HTTPNotFound()
+    return serve_asset(request, request.match_info['filename'])
+
+
+@routes.post('/api/test-connection')
+async def test_connection(request):
+    """Test connection to LLAMA LLM service"""
+    try:
+        result = await get_llama_client(request).test_connection()
+
+        if result["status"] == "success":
+            return web.json_response({
+                "status": "success",
+                "message": "Connection successful!",
+                "details": "All services are operational"
+            })
+        return web.json_response({
+            "status": "error",
+            "message": result["message"],
+            "details": "Please check your configuration and network connection"
+        })
+
+    except Exception as e:
+        return error_response(f"Connection test failed: {str(e)}", 500,
+                              details="Check server logs for more information")
+
+
+@routes.post('/api/chat')
+async def chat(request):
+    """Send a chat message to LLAMA LLM"""
+    try:
+        data = await read_json(request)
+        message = data.get('message', '').strip()
+
+        if not message:
+            return error_response("Message cannot be empty", 400)
+
+        conversation_id, conversation_history = await resolve_conversation(data)
+        if conversation_id is None:
+            return conversation_not_found()
+
+        result = await get_llama_client(request).send_chat_message(message, conversation_history)
+
+        if result["status"] == "success":
+            await store_call(
+                conversation_store.append,
+                conversation_id,
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": result["message"]}
+            )
+            return web.json_response({
+                "status": "success",
+                "message": result["message"],
+                "conversation_id": conversation_id
+            })
+        return error_response(result["message"], 400)
+
+    except Exception as e:
+        return error_response(f"Chat request failed: {str(e)}", 500)
+
+
+def sse_event(data):
+    """Format a dict as a Server-Sent Events frame"""
+    return b"data: " + json_codec.dumps(data) + b"\n\n"
+
+
+@routes.post('/api/chat/stream')
+async def chat_stream(request):
+    """Stream a chat reply from LLAMA LLM as Server-Sent Events"""
+    try:
+        data = await read_json(request)
+        message = data.get('message', '').strip()
+
+        if not message:
+            return error_response("Message cannot be empty", 400)
+
+        conversation_id, conversation_history = await resolve_conversation(data)
+        if conversation_id is None:
+            return conversation_not_found()
+
+    except Exception as e:
+        return error_response(f"Chat request failed: {str(e)}", 500)
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "X-Conversation-Id": conversation_id
+    })
+    await response.prepare(request)
+
+    events = get_llama_client(request).stream_chat_message(message, conversation_history)
+    try:
+        async for event in events:
+            if event["status"] == "delta":
+                await response.write(sse_event({"status": "delta", "content": event["content"]}))
+                continue
+            if event["status"] == "success":
+                await store_call(
+                    conversation_store.append,
+                    conversation_id,
+                    {"role": "user", "content": message},
+                    {"role": "assistant", "content": event["message"]}
+                )
+            await response.write(sse_event({
+                "status": event["status"],
+                "message": event["message"],
+                "conversation_id": conversation_id
+            }))
+        await response.write_eof()
+    except ConnectionResetError:
+        # The browser went away mid-reply; nothing left to send it
+        pass
+    finally:
+        # Stop reading upstream and give back the client's concurrency slot
+        await events.aclose()
+    return response
+
+
+@routes.get('/api/conversations/{conversation_id}')
+async def get_conversation(request):
+    """Get the stored messages of a conversation"""
+    conversation_id = request.match_info['conversation_id']
+    messages = await store_call(conversation_store.get_messages, conversation_id)
+    if messages is None:
+        return conversation_not_found()
+    return web.json_response({
+        "status": "success",
+        "conversation_id": conversation_id,
+        "messages": list(messages)
+    })
+
+
+@routes.delete('/api/conversations/{conversation_id}')
+async def delete_conversation(request):
+    """Forget a stored conversation"""
+    if not await store_call(conversation_store.delete, request.match_info['conversation_id']):
+        return conversation_not_found()
+    return web.json_response({"status": "success"})
+
+
+@routes.get('/api/models')
+async def get_models(request):
+    """Get available models from LLAMA LLM service"""
+    try:
+        result = await get_llama_client(request).get_available_models()
+
+        if result["status"] == "success":
+            return web.json_response({
+                "status": "success",
+                "models": result["models"]
+            })
+        return error_response(result["message"], 400)
+
+    except Exception as e:
+        return error_response(f"Failed to get models: {str(e)}", 500)
+
+
+@routes.get('/api/health')
+async def health_check(request):
+    """Health check endpoint"""
+    return web.json_response({
+        "status": "healthy",
+        "service": "LLAMA LLM Chat Backend",
+        "version": "1.0.0"
+    })
+
+
+@web.middleware
+async def json_errors(request, handler):
+    """Return JSON instead of HTML for unknown endpoints"""
+    try:
+        response = await handler(request)
+    except web.HTTPNotFound:
+        return error_response("Endpoint not found", 404)
+    return response
+
+
+async def on_startup(app):
+    app['llama_client'] = AsyncLlamaClient(max_concurrency=ASYNC_SERVER_MAX_CONCURRENCY)
+
+
+async def on_cleanup(app):
+    await app['llama_client'].close()
+
+
+def create_app() -> web.Application:
+    app = web.Application(middlewares=[json_errors])
+    app.add_routes(routes)
+    # Static files last so they never shadow an API route
+    app.router.add_get('/{filename:.+}', serve_static)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == '__main__':
+    print("⚡ Starting LLAMA LLM Chat Server (async)...")
+    print(f"📱 Frontend will be available at: http://localhost:{ASYNC_SERVER_PORT}")
+    print("🔧 API endpoints:")
+    print("   - POST /api/test-connection")
+    print("   - POST /api/chat")
+    print("   - POST /api/chat/stream")
+    print("   - GET/DELETE /api/conversations/<id>")
+    print("   - GET  /api/models")
+    print("   - GET  /api/health")
+    print("=" * 50)
+
+    web.run_app(create_app(), host=ASYNC_SERVER_HOST, port=ASYNC_SERVER_PORT, backlog=SERVER_BACKLOG)
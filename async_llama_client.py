@@ -0,0 +1,534 @@
+"""
+asyncio client for the LLAMA LLM service with bounded concurrency
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator, Dict, Optional, Sequence
+
+import aiohttp
+
+import json_codec
+from config import (CLIENT_ID, CLIENT_SECRET, APIM_SUBSCRIPTION_KEY, BASE_URL, AUTH_URI, TENANT_ID, SCOPE,
+                    HTTP_POOL_MAXSIZE, HTTP_POOL_IDLE_TIMEOUT, ASYNC_MAX_CONCURRENCY, ASYNC_POOL_LIMIT,
+                    RESPONSE_CACHE_ENABLED, UPSTREAM_COMPRESSION, COALESCE_ENABLED)
+from token_provider import get_token_provider
+from llama_client import DEFAULT_CHAT_PARAMS, IDEMPOTENT_METHODS, extract_content
+from retry_policy import RetryPolicy
+from rate_limiter import FileBackend, RateLimiter, RateLimitTimeout, estimate_request_tokens
+from response_cache import ResponseCache, canonical_payload_key
+from coalescing import RequestCoalescer
+from compression import Compressor
+from history import HistoryManager, MessagesView, estimate_message_tokens
+from metrics import (TOKEN_ACQUIRE_SECONDS, UPSTREAM_TTFB_SECONDS, UPSTREAM_SECONDS, JSON_SECONDS, UPSTREAM_ERRORS,
+                     UPSTREAM_IN_FLIGHT, record_usage)
+
+
+class AsyncLlamaClient:
+    """Async counterpart of LlamaClient with the same methods and result dictionaries.
+
+    All requests share one aiohttp connection pool, and a semaphore caps the
+    number of requests in flight so a single event loop can drive hundreds of
+    conversations without overrunning the gateway. Retries, client-side rate
+    limiting, the response cache, coalescing of identical non-streaming
+    requests and the upstream metrics work as in LlamaClient.
+    """
+
+    def __init__(self, max_concurrency: int = ASYNC_MAX_CONCURRENCY,
+                 session: Optional[aiohttp.ClientSession] = None,
+                 history_manager: Optional[HistoryManager] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 coalescer: Optional[RequestCoalescer] = None):
+        self.base_url = BASE_URL
+        self.client_id = CLIENT_ID
+        self.client_secret = CLIENT_SECRET
+        self.subscription_key = APIM_SUBSCRIPTION_KEY
+        self.auth_uri = AUTH_URI
+        self.tenant_id = TENANT_ID
+        self.scope = SCOPE
+        self.access_token = None
+        self.token_expires_at = 0
+        # Shared with LlamaClient, so sync and async callers reuse one token
+        self.token_provider = get_token_provider(
+            self.client_id, self.client_secret, f"{self.auth_uri}/{self.tenant_id}", self.scope
+        )
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session = session
+        self._owns_session = session is None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.history_manager = history_manager or HistoryManager()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.response_cache = response_cache or (ResponseCache() if RESPONSE_CACHE_ENABLED else None)
+        self.coalescer = coalescer or (RequestCoalescer() if COALESCE_ENABLED else None)
+        self.upstream_compression = UPSTREAM_COMPRESSION or None
+        self.compressor = Compressor()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Create the pooled session on first use (it must belong to the running loop)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=max(ASYNC_POOL_LIMIT, self.max_concurrency),
+                limit_per_host=max(HTTP_POOL_MAXSIZE, self.max_concurrency),
+                keepalive_timeout=HTTP_POOL_IDLE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._owns_session = True
+        return self._session
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def get_access_token(self) -> str:
+        """Get access token without blocking the event loop"""
+        try:
+            # MSAL is synchronous, so the (rare) refresh runs in a worker thread
+            self.access_token, self.token_expires_at = await asyncio.to_thread(self.token_provider.get_token)
+            return self.access_token
+        except Exception as e:
+            raise Exception(f"Authentication failed: {str(e)}")
+
+    def is_token_valid(self) -> bool:
+        """Check if current token is still valid"""
+        return self.access_token and time.time() < self.token_expires_at
+
+    async def ensure_valid_token(self):
+        """Ensure we have a valid access token; concurrent callers share one refresh"""
+        started = time.perf_counter()
+        if self.is_token_valid():
+            pass
+        elif self.token_provider.is_token_valid():
+            self.access_token, self.token_expires_at = self.token_provider.get_token()
+        else:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.ensure_future(self.get_access_token())
+            await asyncio.shield(self._refresh_task)
+        TOKEN_ACQUIRE_SECONDS.observe(time.perf_counter() - started)
+
+    def _headers(self, accept: str = "application/json") -> Dict:
+        return {
+            "Authorization": f"Bearer {self.access_token}",
+            "Ocp-Apim-Subscription-Key": self.subscription_key,
+            "Content-Type": "application/json",
+            "Accept": accept
+        }
+
+    async def _send(self, method: str, url: str, operation: str, stream: bool = False,
+                    **kwargs) -> aiohttp.ClientResponse:
+        """One HTTP attempt, timed for the upstream latency metrics; non-stream bodies are read in full"""
+        UPSTREAM_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            response = await self._get_session().request(method, url, **kwargs)
+            # request() returns as soon as the response headers have been parsed
+            UPSTREAM_TTFB_SECONDS.labels(operation).observe(time.perf_counter() - started)
+            if not stream:
+                try:
+                    await response.read()
+                except BaseException:
+                    response.release()
+                    raise
+                UPSTREAM_SECONDS.labels(operation).observe(time.perf_counter() - started)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            UPSTREAM_ERRORS.labels(operation, "network").inc()
+            raise
+        finally:
+            UPSTREAM_IN_FLIGHT.dec()
+        if response.status >= 400:
+            UPSTREAM_ERRORS.labels(operation, response.status).inc()
+        return response
+
+    async def _request(self, method: str, url: str, tokens: int = 0, operation: str = "other",
+                       timeout=None, stream: bool = False, **kwargs) -> aiohttp.ClientResponse:
+        """Send a request with the same retry and rate-limit rules as LlamaClient._request.
+
+        A numeric ``timeout`` is a total in seconds, cut to what is left of the
+        retry deadline on later attempts; an aiohttp.ClientTimeout is used as is.
+        The caller must release the returned response.
+        """
+        policy = self.retry_policy
+        deadline_at = time.monotonic() + policy.deadline
+        attempt = 0
+        while True:
+            if isinstance(timeout, (int, float)):
+                kwargs["timeout"] = aiohttp.ClientTimeout(total=max(min(timeout, deadline_at - time.monotonic()), 0.1))
+            elif timeout is not None:
+                kwargs["timeout"] = timeout
+            wait = await self._limiter_call(self.rate_limiter.reserve, tokens if attempt == 0 else 0)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await self._send(method, url, operation, stream, **kwargs)
+            except aiohttp.ClientConnectionError as e:
+                # A POST is only resent if no connection was made, as it cannot have reached the model
+                if method not in IDEMPOTENT_METHODS and not isinstance(e, aiohttp.ClientConnectorError):
+                    raise
+                delay = policy.next_delay(attempt, deadline_at)
+                if delay is None:
+                    raise
+            else:
+                if not policy.should_retry_status(response.status, method in IDEMPOTENT_METHODS):
+                    return response
+                delay = policy.next_delay(attempt, deadline_at, response.headers.get("Retry-After"))
+                if delay is None:
+                    return response
+                response.release()
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _limiter_call(self, method, *args):
+        """Call a rate limiter method, off the event loop if its state is a flock-protected file"""
+        if isinstance(self.rate_limiter.backend, FileBackend):
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def _cache_call(self, method, *args):
+        """Call a response cache method, off the event loop if it reads or writes SQLite"""
+        if self.response_cache.disk:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def test_connection(self) -> Dict:
+        """Test the connection to the LLAMA LLM service"""
+        try:
+            async with self._get_semaphore():
+                await self.ensure_valid_token()
+
+                test_url = f"{self.base_url}/v1/health"
+
+                response = await self._request("GET", test_url, operation="health", headers=self._headers(),
+                                               timeout=30)
+                try:
+                    text = await response.text()
+                    if response.status == 200:
+                        return {
+                            "status": "success",
+                            "message": "Connection successful",
+                            "response": json_codec.loads(text) if response.content_type == "application/json"
+                            else text
+                        }
+                    return {
+                        "status": "error",
+                        "message": f"Connection failed with status {response.status}",
+                        "response": text
+                    }
+                finally:
+                    response.release()
+
+        except RateLimitTimeout as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {
+                "status": "error",
+                "message": f"Network error: {str(e) or type(e).__name__}"
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Unexpected error: {str(e)}"
+            }
+
+    def _chat_payload(self, message: str, conversation_history: Optional[Sequence[Dict]], stream: bool,
+                      sampling: Dict) -> Dict:
+        params = {**DEFAULT_CHAT_PARAMS, **sampling}
+        reserve = estimate_message_tokens({"content": message}) + int(params.get("max_tokens") or 0)
+        history = self.history_manager.fit(conversation_history or [], reserve)
+        payload = {
+            # A view, so the caller's history is neither copied nor appended to
+            "messages": MessagesView(history, {"role": "user", "content": message}),
+            **params
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def _payload_key(self, payload: Dict) -> Optional[str]:
+        """canonical_payload_key, computed only if the response cache or coalescer will use it"""
+        if ((self.response_cache and self.response_cache.is_cacheable(payload))
+                or (self.coalescer and self.coalescer.applies(payload))):
+            return canonical_payload_key(payload)
+        return None
+
+    def _encode_payload(self, payload: Dict, headers: Dict) -> bytes:
+        """Serialize a JSON payload, compressing it when upstream compression is enabled"""
+        started = time.perf_counter()
+        body = json_codec.dumps(payload)
+        JSON_SECONDS.labels("encode").observe(time.perf_counter() - started)
+        if self.upstream_compression:
+            compressed = self.compressor.compress(body, self.upstream_compression)
+            if compressed is not None:
+                headers["Content-Encoding"] = self.upstream_compression
+                return compressed
+        return body
+
+    async def send_chat_message(self, message: str, conversation_history: Optional[Sequence[Dict]] = None,
+                                **sampling) -> Dict:
+        """Send a chat message to the LLAMA LLM; keyword arguments override sampling parameters"""
+        try:
+            payload = self._chat_payload(message, conversation_history, False, sampling)
+
+            key = self._payload_key(payload)
+            if self.response_cache:
+                cached = await self._cache_call(self.response_cache.get, payload, key)
+                if cached is not None:
+                    return {
+                        "status": "success",
+                        "response": cached,
+                        "message": extract_content(cached),
+                        "cached": True
+                    }
+
+            if self.coalescer and self.coalescer.applies(payload):
+                return await self.coalescer.acall(key, lambda: self._complete_chat(payload, key))
+            return await self._complete_chat(payload, key)
+
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Unexpected error: {str(e)}"
+            }
+
+    async def _complete_chat(self, payload: Dict, key: Optional[str] = None) -> Dict:
+        """Send a prepared chat payload upstream and cache a successful result"""
+        try:
+            async with self._get_semaphore():
+                await self.ensure_valid_token()
+
+                chat_url = f"{self.base_url}/v1/chat/completions"
+                headers = self._headers()
+                estimated_tokens = estimate_request_tokens(payload)
+                body = self._encode_payload(payload, headers)
+
+                response = await self._request("POST", chat_url, tokens=estimated_tokens, operation="chat",
+                                               headers=headers, data=body, timeout=60)
+                try:
+                    if response.status != 200:
+                        return {
+                            "status": "error",
+                            "message": f"Chat request failed with status {response.status}",
+                            "response": await response.text()
+                        }
+                    started = time.perf_counter()
+                    response_data = json_codec.loads(await response.read())
+                    JSON_SECONDS.labels("decode").observe(time.perf_counter() - started)
+                finally:
+                    response.release()
+
+            record_usage(response_data.get("usage"))
+            await self._limiter_call(self.rate_limiter.reconcile, estimated_tokens,
+                                     (response_data.get("usage") or {}).get("total_tokens"))
+            if self.response_cache:
+                await self._cache_call(self.response_cache.set, payload, response_data, key)
+            return {
+                "status": "success",
+                "response": response_data,
+                "message": extract_content(response_data)
+            }
+
+        except RateLimitTimeout as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {
+                "status": "error",
+                "message": f"Network error: {str(e) or type(e).__name__}"
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Unexpected error: {str(e)}"
+            }
+
+    async def stream_chat_message(self, message: str, conversation_history: Optional[Sequence[Dict]] = None,
+                                  **sampling) -> AsyncIterator[Dict]:
+        """Stream a chat completion; yields the same dictionaries as LlamaClient.stream_chat_message.
+
+        Identical streams are not coalesced here; the response cache still applies.
+        """
+        try:
+            payload = self._chat_payload(message, conversation_history, True, sampling)
+
+            key = self._payload_key(payload)
+            if self.response_cache:
+                cached = await self._cache_call(self.response_cache.get, payload, key)
+                if cached is not None:
+                    # Replay a cached completion as a single delta
+                    content = extract_content(cached)
+                    if content:
+                        yield {"status": "delta", "content": content}
+                    yield {"status": "success", "message": content, "usage": cached.get("usage"), "cached": True}
+                    return
+
+        except Exception as e:
+            yield {
+                "status": "error",
+                "message": f"Unexpected error: {str(e)}"
+            }
+            return
+
+        events = self._stream_chat(payload, key)
+        try:
+            async for event in events:
+                yield event
+        finally:
+            # async for does not close the inner generator when this one is closed early
+            await events.aclose()
+
+    async def _stream_chat(self, payload: Dict, key: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Stream a prepared chat payload from upstream and cache the completed reply"""
+        response = None
+        try:
+            async with self._get_semaphore():
+                await self.ensure_valid_token()
+
+                chat_url = f"{self.base_url}/v1/chat/completions"
+                headers = self._headers("text/event-stream")
+                estimated_tokens = estimate_request_tokens(payload)
+                body = self._encode_payload(payload, headers)
+                # Only bound the wait between chunks, not the whole generation
+                timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=60)
+                started = time.perf_counter()
+
+                response = await self._request("POST", chat_url, tokens=estimated_tokens, operation="chat_stream",
+                                               headers=headers, data=body, timeout=timeout, stream=True)
+                if response.status != 200:
+                    yield {
+                        "status": "error",
+                        "message": f"Chat request failed with status {response.status}",
+                        "response": await response.text()
+                    }
+                    return
+
+                parts = []
+                usage = None
+                finish_reason = None
+                done = False
+                completion = {}
+                decode_seconds = 0.0
+                async for raw_line in response.content:
+                    line = raw_line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        done = True
+                        break
+
+                    decode_started = time.perf_counter()
+                    chunk = json_codec.loads(data)
+                    decode_seconds += time.perf_counter() - decode_started
+                    usage = chunk.get("usage") or usage
+                    if not completion:
+                        completion = {field: chunk[field] for field in ("id", "created", "model") if field in chunk}
+                    choices = chunk.get("choices") or [{}]
+                    finish_reason = choices[0].get("finish_reason") or finish_reason
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        parts.append(content)
+                        yield {"status": "delta", "content": content}
+
+                if done:
+                    # Read to EOF so release() returns the connection to the pool rather than closing it
+                    await response.content.read()
+                elif not finish_reason:
+                    # The connection closed mid-reply; the text so far is not a complete answer
+                    yield {
+                        "status": "error",
+                        "message": "Stream ended before the reply was complete"
+                    }
+                    return
+
+                UPSTREAM_SECONDS.labels("chat_stream").observe(time.perf_counter() - started)
+                JSON_SECONDS.labels("decode").observe(decode_seconds)
+
+            record_usage(usage)
+            if usage:
+                await self._limiter_call(self.rate_limiter.reconcile, estimated_tokens, usage.get("total_tokens"))
+            # As in LlamaClient: only a stream closed with [DONE] is cached, as a full chat.completion
+            if self.response_cache and done:
+                await self._cache_call(self.response_cache.set, payload, {
+                    **completion,
+                    "object": "chat.completion",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(parts)},
+                        "finish_reason": finish_reason
+                    }],
+                    "usage": usage
+                }, key)
+            yield {
+                "status": "success",
+                "message": "".join(parts),
+                "usage": usage
+            }
+
+        except RateLimitTimeout as e:
+            yield {
+                "status": "error",
+                "message": str(e)
+            }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            yield {
+                "status": "error",
+                "message": f"Network error: {str(e) or type(e).__name__}"
+            }
+        except Exception as e:
+            yield {
+                "status": "error",
+                "message": f"Unexpected error: {str(e)}"
+            }
+        finally:
+            if response is not None:
+                response.release()
+
+    async def get_available_models(self) -> Dict:
+        """Get list of available models"""
+        try:
+            async with self._get_semaphore():
+                await self.ensure_valid_token()
+
+                models_url = f"{self.base_url}/v1/models"
+
+                response = await self._request("GET", models_url, operation="models", headers=self._headers(),
+                                               timeout=30)
+                try:
+                    if response.status == 200:
+                        return {
+                            "status": "success",
+                            "models": json_codec.loads(await response.read())
+                        }
+                    return {
+                        "status": "error",
+                        "message": f"Failed to get models with status {response.status}",
+                        "response": await response.text()
+                    }
+                finally:
+                    response.release()
+
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Error getting models: {str(e) or type(e).__name__}"
+            }
+
+    async def close(self):
+        """Close the pooled session if this client created it"""
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
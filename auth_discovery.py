@@ -0,0 +1,208 @@
+"""
+Concurrent Azure AD tenant/scope discovery with an on-disk cache of known failures
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import msal
+
+from config import AUTH_DISCOVERY_MAX_WORKERS, AUTH_DISCOVERY_CACHE_FILE, AUTH_DISCOVERY_NEGATIVE_TTL
+from http_pool import PooledSession
+
+# AAD errors that say nothing about whether the (tenant, scope) pair is valid
+TRANSIENT_ERRORS = ("temporarily_unavailable", "server_error", "request_timeout")
+
+# OIDC discovery statuses and MSAL/AAD messages that mean the tenant or authority really is invalid.
+# Anything else (429, 5xx, a proxy's non-JSON page) may succeed on the next run.
+DEFINITE_DISCOVERY_STATUSES = (400, 404)
+DEFINITE_DISCOVERY_MARKERS = ("AADSTS90002", "invalid_instance", "should consist of an https url")
+
+
+class DiscoveryUnavailable(Exception):
+    """Authority discovery failed for a reason that says nothing about the tenant"""
+
+
+def is_definite_rejection(error: BaseException) -> bool:
+    """True if an MSAL ValueError from authority discovery means the tenant does not exist.
+
+    MSAL replaces the discovery error with a generic message, so the chained
+    original (which carries the HTTP status) is inspected too.
+    """
+    messages = []
+    while error is not None and len(messages) < 5:
+        messages.append(str(error))
+        error = error.__cause__ or error.__context__
+    text = " ".join(messages)
+    if any(marker in text for marker in DEFINITE_DISCOVERY_MARKERS):
+        return True
+    status = re.search(r"HTTP status: (\d+)", text)
+    return status is not None and int(status.group(1)) in DEFINITE_DISCOVERY_STATUSES
+
+
+class NegativeCache:
+    """JSON file of (tenant, scope) pairs that failed recently, keyed per client credential"""
+
+    def __init__(self, path: str, ttl: float = AUTH_DISCOVERY_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    def get(self, key: str) -> Optional[str]:
+        """The cached failure message, if this key failed within the TTL"""
+        entry = self._entries.get(key)
+        if entry and time.time() - entry["at"] < self.ttl:
+            return entry["message"]
+        return None
+
+    def add(self, key: str, message: str):
+        with self._lock:
+            self._entries[key] = {"message": message, "at": time.time()}
+
+    def save(self):
+        """Atomically rewrite the cache file, dropping expired entries"""
+        if not self.path:
+            return
+        with self._lock:
+            now = time.time()
+            live = {k: v for k, v in self._entries.items() if now - v["at"] < self.ttl}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(live, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+class AuthDiscovery:
+    """Tries (tenant, scope) candidates in parallel with the client-credentials flow.
+
+    One MSAL application is built per authority and shared by every scope
+    tried against it, and all applications share one pooled HTTP session. With
+    ``stop_on_success`` the run ends at the first working pair; candidates not
+    yet started are reported as skipped. Definitive AAD rejections are cached
+    in ``cache_file`` for ``negative_ttl`` seconds so repeat runs skip them.
+    """
+
+    def __init__(self, client_id: str, client_secret: str, auth_uri: str,
+                 max_workers: int = AUTH_DISCOVERY_MAX_WORKERS,
+                 cache_file: Optional[str] = AUTH_DISCOVERY_CACHE_FILE,
+                 negative_ttl: float = AUTH_DISCOVERY_NEGATIVE_TTL):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.auth_uri = auth_uri
+        self.max_workers = max_workers
+        self.cache = NegativeCache(cache_file, negative_ttl)
+        # Cached failures are only valid for the credential that produced them
+        self._credential_id = hashlib.sha256(f"{client_id}:{client_secret}".encode("utf-8")).hexdigest()[:16]
+        self.http = PooledSession(pool_maxsize=max_workers)
+        self._apps: Dict[str, msal.ConfidentialClientApplication] = {}
+        self._app_errors: Dict[str, str] = {}
+        self._app_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _cache_key(self, tenant: str, scope: str) -> str:
+        return f"{self._credential_id}|{tenant}|{scope}"
+
+    def _get_app(self, tenant: str) -> msal.ConfidentialClientApplication:
+        """The shared MSAL app for a tenant; building it (authority discovery) happens once"""
+        with self._lock:
+            lock = self._app_locks.setdefault(tenant, threading.Lock())
+        with lock:
+            if tenant in self._app_errors:
+                raise ValueError(self._app_errors[tenant])
+            if tenant not in self._apps:
+                try:
+                    self._apps[tenant] = msal.ConfidentialClientApplication(
+                        client_id=self.client_id,
+                        client_credential=self.client_secret,
+                        authority=f"{self.auth_uri}/{tenant}",
+                        http_client=self.http.session
+                    )
+                except ValueError as e:
+                    # MSAL raises ValueError for an unknown authority, but also for throttled
+                    # or garbled discovery responses; only the former is remembered
+                    if not is_definite_rejection(e):
+                        raise DiscoveryUnavailable(str(e)) from e
+                    self._app_errors[tenant] = str(e)
+                    raise
+            return self._apps[tenant]
+
+    @staticmethod
+    def _new_result(tenant: str, scope: str) -> Dict:
+        return {"tenant": tenant, "scope": scope, "success": False, "message": None, "error_code": None,
+                "token_preview": None, "cached": False, "skipped": False}
+
+    def _skipped(self, tenant: str, scope: str) -> Dict:
+        result = self._new_result(tenant, scope)
+        result.update(message="Skipped after a working combination was found", skipped=True)
+        return result
+
+    def try_candidate(self, tenant: str, scope: str, stop: Optional[threading.Event] = None) -> Dict:
+        """Acquire a token for one (tenant, scope) pair"""
+        result = self._new_result(tenant, scope)
+        key = self._cache_key(tenant, scope)
+        cached = self.cache.get(key)
+        if cached is not None:
+            result.update(message=cached, cached=True)
+            return result
+        if stop is not None and stop.is_set():
+            return self._skipped(tenant, scope)
+
+        try:
+            token = self._get_app(tenant).acquire_token_for_client(scopes=[scope])
+        except ValueError as e:
+            result["message"] = str(e)
+            self.cache.add(key, result["message"])
+            return result
+        except Exception as e:
+            # Network problems and transient discovery failures say nothing about the candidate,
+            # so they are not cached
+            result["message"] = str(e)
+            return result
+
+        if "access_token" in token:
+            result.update(success=True, message="Success", token_preview=token["access_token"][:50] + "...")
+            return result
+
+        result["message"] = token.get("error_description", "Unknown error")
+        result["error_code"] = token.get("error")
+        if result["error_code"] not in TRANSIENT_ERRORS:
+            self.cache.add(key, result["message"])
+        return result
+
+    def run(self, candidates: List[Tuple[str, str]], stop_on_success: bool = True) -> Iterator[Dict]:
+        """Try candidates concurrently, yielding results in completion order"""
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="auth-discovery")
+        futures = {executor.submit(self.try_candidate, tenant, scope, stop): (tenant, scope)
+                   for tenant, scope in candidates}
+        try:
+            for future in as_completed(futures):
+                if future.cancelled():
+                    yield self._skipped(*futures[future])
+                    continue
+                result = future.result()
+                if result["success"] and stop_on_success:
+                    stop.set()
+                    # Candidates that have not started yet will not start
+                    for pending in futures:
+                        pending.cancel()
+                yield result
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.cache.save()
+
+    def close(self):
+        self.http.close()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Batch chat-completion runner for JSONL files of chat requests
+
+Each input line is a JSON object such as:
+
+    {"id": "q1", "message": "What is reinsurance?", "conversation_history": [], "temperature": 0}
+
+Sampling fields (temperature, max_tokens, top_p, ...) override the defaults
+for that line. Results are appended to the output JSONL as they finish (not
+in input order) and progress is checkpointed, so a crashed run can be
+restarted with the same arguments and will skip lines that already
+completed. Lines whose request failed upstream are sent again on the next
+run, so a line may have several records; the last one is its result. Lines
+that can never succeed (invalid JSON, no message) are not retried. Delivery
+is at-least-once: a line that finished after the last checkpoint write is
+sent again on resume.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from llama_client import DEFAULT_CHAT_PARAMS, LlamaClient
+
+
+class Checkpoint:
+    """Tracks completed input lines in memory bounded by the failures, not the input size.
+
+    Stores a watermark (every line up to it is finished) plus the few finished
+    lines above it, which is bounded by the number of requests in flight, and
+    the lines whose request failed, which are not done and are retried.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.watermark = 0
+        self.done_above: Set[int] = set()
+        self.failed: Set[int] = set()
+        self.completed = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.watermark = data.get("watermark", 0)
+        self.done_above = set(data.get("done_above", []))
+        self.failed = set(data.get("failed", []))
+
+    def is_done(self, line_no: int) -> bool:
+        return (line_no <= self.watermark or line_no in self.done_above) and line_no not in self.failed
+
+    def mark_done(self, line_no: int, skipped: bool = False, failed: bool = False):
+        """Record a finished line.
+
+        ``skipped`` lines (e.g. blank) advance the watermark without counting;
+        ``failed`` lines advance it too but stay pending for the next run.
+        """
+        if failed:
+            self.failed.add(line_no)
+        else:
+            self.failed.discard(line_no)
+        if not skipped:
+            self.completed += 1
+        if line_no > self.watermark:
+            self.done_above.add(line_no)
+        while self.watermark + 1 in self.done_above:
+            self.watermark += 1
+            self.done_above.discard(self.watermark)
+
+    def save(self):
+        """Atomically rewrite the checkpoint file"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"watermark": self.watermark, "done_above": sorted(self.done_above),
+                       "failed": sorted(self.failed)}, f)
+        os.replace(tmp_path, self.path)
+
+
+def iter_requests(input_path: str, checkpoint: Checkpoint) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """Stream (line_no, record, error) for every line not already completed"""
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if checkpoint.is_done(line_no):
+                continue
+            if not line.strip():
+                checkpoint.mark_done(line_no, skipped=True)
+                continue
+            try:
+                yield line_no, json.loads(line), None
+            except json.JSONDecodeError as e:
+                yield line_no, None, f"Invalid JSON: {e}"
+
+
+def validate_record(record) -> Optional[str]:
+    """Why a parsed line can never be sent, or None if it is a usable request"""
+    if not isinstance(record, dict):
+        return f"Expected a JSON object, got {type(record).__name__}"
+    message = record.get("message") or record.get("prompt")
+    if not isinstance(message, str) or not message.strip():
+        return "No message or prompt"
+    return None
+
+
+def run_request(client: LlamaClient, line_no: int, record: Dict) -> Dict:
+    """Send one chat request and build its output record; never raises, so one bad line can't stop the batch"""
+    started = time.monotonic()
+    record_id = record.get("id", record.get("request_id"))
+    try:
+        message = record.get("message") or record.get("prompt")
+        sampling = {name: record[name] for name in DEFAULT_CHAT_PARAMS if name in record}
+        result = client.send_chat_message(message, record.get("conversation_history") or [], **sampling)
+    except Exception as e:
+        return {"line": line_no, "id": record_id, "status": "error", "message": f"Unexpected error: {e}",
+                "latency": round(time.monotonic() - started, 3)}
+    return {
+        "line": line_no,
+        "id": record_id,
+        "status": result["status"],
+        "message": result["message"],
+        "usage": result.get("response", {}).get("usage") if result["status"] == "success" else None,
+        "latency": round(time.monotonic() - started, 3)
+    }
+
+
+def run_batch(input_path: str, output_path: str, concurrency: int = 8,
+              checkpoint_path: Optional[str] = None, checkpoint_every: int = 10,
+              client: Optional[LlamaClient] = None) -> Dict:
+    """Run every pending request in input_path and append results to output_path"""
+    checkpoint = Checkpoint(checkpoint_path or f"{output_path}.checkpoint")
+    client = client or LlamaClient()
+    summary = {"success": 0, "error": 0, "resumed_from": checkpoint.watermark}
+    started = time.monotonic()
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = set()
+        requests_iter = iter_requests(input_path, checkpoint)
+
+        def record_result(result: Dict, retryable: bool = True):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            summary[result["status"]] = summary.get(result["status"], 0) + 1
+            # Upstream failures (throttling, network) stay pending for the next run; bad input does not
+            checkpoint.mark_done(result["line"], failed=retryable and result["status"] != "success")
+            if checkpoint.completed % checkpoint_every == 0:
+                checkpoint.save()
+
+        try:
+            while True:
+                # Keep a bounded window of work in flight so memory stays flat
+                while len(pending) < concurrency * 2:
+                    item = next(requests_iter, None)
+                    if item is None:
+                        break
+                    line_no, record, error = item
+                    error = error or validate_record(record)
+                    if error:
+                        record_id = record.get("id", record.get("request_id")) if isinstance(record, dict) else None
+                        record_result({"line": line_no, "id": record_id, "status": "error", "message": error},
+                                      retryable=False)
+                        continue
+                    pending.add(executor.submit(run_request, client, line_no, record))
+
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record_result(future.result())
+        finally:
+            # Persist progress even if the run is interrupted
+            checkpoint.save()
+
+    summary["retry_pending"] = len(checkpoint.failed)
+    summary["elapsed"] = round(time.monotonic() - started, 3)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of chat requests against LLAMA LLM")
+    parser.add_argument("input", help="Input JSONL file of chat requests")
+    parser.add_argument("output", help="Output JSONL file (appended to)")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="Requests in flight (default: 8)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--checkpoint-every", type=int, default=10,
+                        help="Write the checkpoint after this many completions (default: 10)")
+    args = parser.parse_args()
+
+    print("📦 LLAMA LLM Batch Runner")
+    print("=" * 50)
+    print(f"Input: {args.input}")
+    print(f"Output: {args.output}")
+    print(f"Concurrency: {args.concurrency}")
+    print()
+
+    try:
+        summary = run_batch(args.input, args.output, args.concurrency, args.checkpoint, args.checkpoint_every)
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted - rerun the same command to resume")
+        sys.exit(130)
+
+    if summary["resumed_from"]:
+        print(f"↩️  Resumed after line {summary['resumed_from']}")
+    print(f"✅ Succeeded: {summary['success']}")
+    print(f"❌ Failed: {summary['error']}")
+    if summary["retry_pending"]:
+        print(f"🔁 {summary['retry_pending']} failed lines will be retried - rerun the same command")
+    print(f"⏱️  Elapsed: {summary['elapsed']}s")
+
+
+if __name__ == "__main__":
+    main()
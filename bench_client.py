@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for LlamaClient's per-call overhead, with the network stubbed out
+
+Each case times one piece of a chat turn (token check, headers, payload, JSON
+encode/decode, reply extraction) or a whole send_chat_message/stream_chat_message
+call against an in-process stub session, for short and very long histories.
+Every run is appended to a JSONL history file and compared with the previous
+run from the same machine and Python version, so changes to the hot path can
+be measured.
+"""
+
+import argparse
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+import json_codec
+from conversation_store import MemoryConversationStore
+from history import History, HistoryManager
+from llama_client import LlamaClient, extract_content
+from rate_limiter import RateLimiter
+from retry_policy import RetryPolicy
+
+DEFAULT_HISTORY_FILE = ".bench_history.jsonl"
+
+# Per-call changes smaller than this are reported as noise
+NOISE_THRESHOLD = 0.05
+
+
+def make_history(turns: int, words_per_message: int = 40) -> List[Dict]:
+    """A conversation of ``turns`` user/assistant pairs"""
+    text = " ".join(["benchmark"] * words_per_message)
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"Question {i}: {text}"})
+        history.append({"role": "assistant", "content": f"Answer {i}: {text}"})
+    return history
+
+
+def make_completion(words: int) -> Dict:
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(["token"] * words)},
+                     "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": words, "total_tokens": 100 + words}
+    }
+
+
+def make_sse(words: int) -> bytes:
+    frames = [f"data: {json.dumps({'choices': [{'delta': {'content': ' token'}}]})}\n\n" for _ in range(words)]
+    frames.append(f"data: {json.dumps({'choices': [{'delta': {}}], 'usage': {'total_tokens': words}})}\n\n")
+    frames.append("data: [DONE]\n\n")
+    return "".join(frames).encode("utf-8")
+
+
+def make_response(body: bytes, content_type: str = "application/json", stream: bool = False) -> requests.Response:
+    """A requests.Response as the transport would return it, without any I/O"""
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = content_type
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.elapsed = timedelta(0)
+    if stream:
+        response.raw = io.BytesIO(body)
+    else:
+        response._content = body
+    return response
+
+
+class StubSession:
+    """Stands in for PooledSession: answers every request with a canned response"""
+
+    def __init__(self, body: bytes, sse: bytes):
+        self.body = body
+        self.sse = sse
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        if kwargs.get("stream"):
+            return make_response(self.sse, "text/event-stream", stream=True)
+        return make_response(self.body)
+
+    def get_stats(self) -> Dict:
+        return {}
+
+    def close(self):
+        pass
+
+
+def make_client(completion_words: int = 50) -> LlamaClient:
+    """A client whose token is already valid and whose session never touches the network"""
+    completion = json.dumps(make_completion(completion_words)).encode("utf-8")
+    # A budget large enough that the long history is sent whole rather than trimmed
+    client = LlamaClient(session=StubSession(completion, make_sse(completion_words)),
+                         retry_policy=RetryPolicy(),
+                         rate_limiter=RateLimiter(requests_per_second=0, tokens_per_minute=0),
+                         history_manager=HistoryManager(max_context_tokens=1_000_000))
+    client.access_token = "bench-token"
+    client.token_expires_at = time.time() + 24 * 3600
+    return client
+
+
+class LongSession:
+    """A stored conversation driven the way app.py does: read, send, then append the turn"""
+
+    # Restart from the base history after this many turns so timings stay comparable
+    MAX_TURNS = 100
+
+    def __init__(self, client: LlamaClient, base: List[Dict]):
+        self.client = client
+        self.base = base
+        self.store = MemoryConversationStore()
+        self.turns = 0
+        self.conversation_id = self.store.create(base)
+
+    def history(self):
+        return self.store.get_messages(self.conversation_id)
+
+    def turn(self):
+        if self.turns >= self.MAX_TURNS:
+            self.store.delete(self.conversation_id)
+            self.conversation_id = self.store.create(self.base)
+            self.turns = 0
+        result = self.client.send_chat_message("Hello", self.history())
+        self.store.append(self.conversation_id, {"role": "user", "content": "Hello"},
+                          {"role": "assistant", "content": result.get("message", "")})
+        self.turns += 1
+
+
+def check_history_not_copied(client: LlamaClient) -> bool:
+    """A send followed by the store's append must extend the stored History in place, not copy it"""
+    session = LongSession(client, make_history(50))
+    before = session.history()
+    session.turn()
+    after = session.history()
+    return isinstance(after, History) and after.shares_storage(before) and len(after) == len(before) + 2
+
+
+def build_cases(client: LlamaClient) -> Dict[str, Callable[[], object]]:
+    """Benchmark name -> zero-argument callable"""
+    small = make_history(2)
+    long = make_history(200)
+    session = LongSession(client, long)
+    small_payload = client._build_payload("Hello", small, {})
+    long_payload = client._build_payload("Hello", long, {})
+    headers = client._headers()
+    small_body = json_codec.dumps(small_payload)
+    long_body = json_codec.dumps(long_payload)
+    small_reply = make_response(json.dumps(make_completion(50)).encode("utf-8"))
+    long_reply = make_response(json.dumps(make_completion(4000)).encode("utf-8"))
+    reply_data = make_completion(50)
+
+    def drain(events):
+        for _ in events:
+            pass
+
+    return {
+        "token_check": client.ensure_valid_token,
+        "headers": client._headers,
+        "payload_small": lambda: client._build_payload("Hello", small, {}),
+        "payload_long": lambda: client._build_payload("Hello", long, {}),
+        "payload_long_history": lambda: client._build_payload("Hello", session.history(), {}),
+        "json_encode_small": lambda: client._encode_payload(small_payload, dict(headers)),
+        "json_encode_long": lambda: client._encode_payload(long_payload, dict(headers)),
+        "json_decode_small": lambda: json_codec.loads(small_body),
+        "json_decode_long": lambda: json_codec.loads(long_body),
+        "response_json_small": lambda: json_codec.loads(small_reply.content),
+        "response_json_long": lambda: json_codec.loads(long_reply.content),
+        "extract_content": lambda: extract_content(reply_data),
+        "send_chat_small": lambda: client.send_chat_message("Hello", small),
+        "send_chat_long": lambda: client.send_chat_message("Hello", long),
+        "session_turn_long": session.turn,
+        "stream_chat_small": lambda: drain(client.stream_chat_message("Hello", small)),
+        "stream_chat_long": lambda: drain(client.stream_chat_message("Hello", long))
+    }
+
+
+def time_case(fn: Callable[[], object], min_time: float, repeat: int) -> Dict:
+    """Per-call seconds over ``repeat`` rounds, each at least ``min_time`` long"""
+    # Calibrate the loop count so one round takes about min_time
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 10 or number >= 1_000_000:
+            break
+        number *= 10
+    number = max(int(number * min_time / max(elapsed, 1e-9)), 1)
+
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - started) / number)
+    return {
+        "loops": number,
+        "min": min(rounds),
+        "median": statistics.median(rounds),
+        "stdev": statistics.stdev(rounds) if len(rounds) > 1 else 0.0
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_history(path: str) -> List[Dict]:
+    runs = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    runs.append(json.loads(line))
+    except (OSError, ValueError):
+        pass
+    return runs
+
+
+def previous_run(runs: List[Dict], current: Dict) -> Optional[Dict]:
+    """Latest earlier run from the same host and Python, the only fair comparison"""
+    for run in reversed(runs):
+        if run.get("host") == current["host"] and run.get("python") == current["python"]:
+            return run
+    return None
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 1e-6:
+        return f"{seconds * 1e9:.0f}ns"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}µs"
+    return f"{seconds * 1e3:.2f}ms"
+
+
+def print_results(run: Dict, baseline: Optional[Dict]):
+    print("=" * 64)
+    header = f"{'case':<22}{'median':>12}{'min':>12}"
+    if baseline:
+        header += f"{'vs ' + (baseline.get('revision') or 'previous'):>18}"
+    print(header)
+    print("-" * 64)
+    for name, result in run["results"].items():
+        line = f"{name:<22}{format_duration(result['median']):>12}{format_duration(result['min']):>12}"
+        before = (baseline or {}).get("results", {}).get(name)
+        if before:
+            change = result["median"] / before["median"] - 1
+            marker = "" if abs(change) < NOISE_THRESHOLD else (" 🐢" if change > 0 else " 🚀")
+            line += f"{change:>+17.1%}{marker}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LlamaClient per-call overhead with the network stubbed")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timing round")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing rounds per case")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_FILE, help="JSONL file that accumulates runs")
+    parser.add_argument("--no-save", action="store_true", help="Do not append this run to the history file")
+    parser.add_argument("--label", help="Free-form note stored with the run (e.g. the change being tested)")
+    args = parser.parse_args()
+
+    client = make_client()
+    if not check_history_not_copied(client):
+        print("❌ Sending a chat copied the stored conversation history")
+        sys.exit(1)
+    cases = build_cases(client)
+    if args.filter:
+        cases = {name: fn for name, fn in cases.items() if args.filter in name}
+    if not cases:
+        print(f"❌ No benchmark matches '{args.filter}'")
+        sys.exit(1)
+
+    print(f"⏱️  Running {len(cases)} benchmarks ({args.repeat} x {args.min_time:g}s each)...")
+    run = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "label": args.label,
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "json_backend": json_codec.BACKEND,
+        "results": {}
+    }
+    for name, fn in cases.items():
+        fn()  # warm up caches and lazily built state
+        run["results"][name] = time_case(fn, args.min_time, args.repeat)
+    client.close()
+
+    print_results(run, previous_run(load_history(args.history), run))
+    if not args.no_save:
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"📝 Run appended to {args.history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,23 @@ Streamlit Chat Application for LLAMA LLM
 
 import streamlit as st
 import json
+import time
 from llama_client import LlamaClient
+from history import History
+
+# Seconds between redraws of a streaming reply, so fast token rates don't flood the browser
+STREAM_RENDER_INTERVAL = 0.05
+
+@st.cache_resource
+def get_llama_client():
+    """One LlamaClient per server process, reused across reruns and sessions"""
+    return LlamaClient()
 
 def initialize_session_state():
     """Initialize session state variables"""
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        # Immutable history: each turn appends in O(1) instead of rebuilding the list
+        st.session_state.messages = History()
     if "client" not in st.session_state:
         st.session_state.client = None
     if "connection_status" not in st.session_state:
@@ -19,7 +30,7 @@ def initialize_session_state():
 def test_connection():
     """Test connection to LLAMA LLM"""
     try:
-        client = LlamaClient()
+        client = get_llama_client()
         result = client.test_connection()
         
         if result["status"] == "success":
@@ -33,28 +44,36 @@ def test_connection():
         st.session_state.connection_status = "failed"
         return False, f"Error: {str(e)}"
 
-def send_message(message):
-    """Send a message to the LLAMA LLM"""
+def stream_message(message, history, placeholder):
+    """Stream the reply into ``placeholder`` as tokens arrive; returns the full text.
+
+    ``history`` is the conversation so far, excluding ``message``.
+    """
     if not st.session_state.client:
+        placeholder.error("Error: No connection to LLAMA LLM")
         return "Error: No connection to LLAMA LLM"
     
+    reply = ""
     try:
-        # Convert session messages to the format expected by the API
-        conversation_history = []
-        for msg in st.session_state.messages:
-            conversation_history.append({
-                "role": "user" if msg["role"] == "user" else "assistant",
-                "content": msg["content"]
-            })
-        
-        result = st.session_state.client.send_chat_message(message, conversation_history)
-        
-        if result["status"] == "success":
-            return result["message"]
-        else:
-            return f"Error: {result['message']}"
+        parts = []
+        last_render = 0.0
+        # Session messages are already in API format and the client never modifies them
+        for event in st.session_state.client.stream_chat_message(message, history):
+            if event["status"] == "delta":
+                parts.append(event["content"])
+                now = time.monotonic()
+                if now - last_render >= STREAM_RENDER_INTERVAL:
+                    placeholder.markdown("".join(parts) + "▌")
+                    last_render = now
+            elif event["status"] == "success":
+                reply = event["message"]
+            else:
+                reply = f"Error: {event['message']}"
     except Exception as e:
-        return f"Error: {str(e)}"
+        reply = f"Error: {str(e)}"
+    
+    placeholder.markdown(reply)
+    return reply
 
 def main():
     st.set_page_config(
@@ -94,7 +113,7 @@ def main():
         
         # Clear chat button
         if st.button("🗑️ Clear Chat"):
-            st.session_state.messages = []
+            st.session_state.messages = History()
             st.rerun()
         
         # Display configuration info
@@ -127,7 +146,7 @@ def main():
         # Export chat
         if st.session_state.messages:
             chat_data = {
-                "messages": st.session_state.messages,
+                "messages": list(st.session_state.messages),
                 "timestamp": st.session_state.get("chat_start_time", "Unknown")
             }
             
@@ -149,7 +168,8 @@ def main():
     # Chat input (must be outside any containers)
     if prompt := st.chat_input("Type your message here..."):
         # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        history = st.session_state.messages
+        st.session_state.messages = history.append({"role": "user", "content": prompt})
         
         # Display user message
         with st.chat_message("user"):
@@ -162,12 +182,15 @@ def main():
         else:
             # Display assistant response
             with st.chat_message("assistant"):
-                with st.spinner("🤖 LLAMA is thinking..."):
-                    response = send_message(prompt)
-                    st.markdown(response)
-                    
-                    # Add assistant response to chat history
-                    st.session_state.messages.append({"role": "assistant", "content": response})
+                # Replaced by the first token, then redrawn as the reply grows
+                placeholder = st.empty()
+                placeholder.markdown("🤖 _LLAMA is thinking..._")
+                response = stream_message(prompt, history, placeholder)
+                
+                # Add assistant response to chat history
+                st.session_state.messages = st.session_state.messages.append(
+                    {"role": "assistant", "content": response}
+                )
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+Single-flight coalescing of identical concurrent chat requests
+"""
+
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Iterator, List
+
+from config import COALESCE_DETERMINISTIC_ONLY
+
+
+class _Call:
+    """One in-flight non-streaming request and, once finished, its result"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _SharedStream:
+    """Events of one in-flight stream; subscribers replay what they missed, then follow live"""
+
+    def __init__(self):
+        self.events: List[Dict] = []
+        self.finished = False
+        self.condition = threading.Condition()
+
+    def publish(self, event: Dict):
+        with self.condition:
+            self.events.append(event)
+            self.condition.notify_all()
+
+    def finish(self):
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+    def subscribe(self, follower: bool) -> Iterator[Dict]:
+        index = 0
+        while True:
+            with self.condition:
+                while index >= len(self.events) and not self.finished:
+                    self.condition.wait()
+                batch = self.events[index:]
+                index = len(self.events)
+                if not batch:
+                    return
+            for event in batch:
+                if follower and event["status"] != "delta":
+                    event = {**event, "coalesced": True}
+                yield event
+
+
+class RequestCoalescer:
+    """Lets concurrent requests with the same key share one upstream call.
+
+    The first caller for a key (the leader) makes the call; callers that
+    arrive while it is in flight wait for and share its result, which is
+    marked ``"coalesced": True`` for them. Streams are pumped by a background
+    thread into a shared buffer so every subscriber, including the first,
+    reads at its own pace, and one client disconnecting does not cut off
+    the others.
+
+    With ``deterministic_only`` (the default) only temperature-0 requests are
+    coalesced, since otherwise each caller expects its own sample.
+    """
+
+    def __init__(self, deterministic_only: bool = COALESCE_DETERMINISTIC_ONLY):
+        self.deterministic_only = deterministic_only
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+        self._async_calls: Dict[str, asyncio.Future] = {}
+
+        self.leaders = 0
+        self.followers = 0
+        self.stream_leaders = 0
+        self.stream_followers = 0
+
+    def applies(self, payload: Dict) -> bool:
+        if not self.deterministic_only:
+            return True
+        return payload.get("temperature") == 0
+
+    def call(self, key: str, fn: Callable[[], Dict]) -> Dict:
+        """Return ``fn()``, or the result of an identical call already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return {**call.result, "coalesced": True}
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def acall(self, key: str, fn: Callable[[], Awaitable[Dict]]) -> Dict:
+        """asyncio version of call: ``await fn()``, or share an identical call already in flight"""
+        with self._lock:
+            future = self._async_calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            # shield: a follower that is cancelled must not cancel the leader's result for the others
+            result = await asyncio.shield(future)
+            return {**result, "coalesced": True}
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved, so a call nobody shared is not logged as unhandled
+            raise
+        finally:
+            with self._lock:
+                del self._async_calls[key]
+            if not future.done():
+                future.cancel()
+
+    def stream(self, key: str, make_stream: Callable[[], Iterator[Dict]]) -> Iterator[Dict]:
+        """Yield the events of ``make_stream()``, shared with identical streams already in flight"""
+        with self._lock:
+            shared = self._streams.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._streams[key] = _SharedStream()
+                self.stream_leaders += 1
+            else:
+                self.stream_followers += 1
+
+        if leader:
+            threading.Thread(target=self._pump, args=(key, shared, make_stream),
+                             name="coalesced-stream", daemon=True).start()
+        return shared.subscribe(follower=not leader)
+
+    def _pump(self, key: str, shared: _SharedStream, make_stream: Callable[[], Iterator[Dict]]):
+        try:
+            for event in make_stream():
+                shared.publish(event)
+        except Exception as e:
+            shared.publish({"status": "error", "message": f"Unexpected error: {str(e)}"})
+        finally:
+            with self._lock:
+                del self._streams[key]
+            shared.finish()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "stream_leaders": self.stream_leaders,
+                "stream_followers": self.stream_followers,
+                "in_flight": len(self._calls) + len(self._streams) + len(self._async_calls)
+            }
@@ -0,0 +1,186 @@
+"""
+gzip/zstd body compression with bytes-saved and CPU-time counters
+"""
+
+import gzip
+import io
+import json
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+from config import COMPRESSION_MIN_SIZE, COMPRESSION_LEVEL, COMPRESSION_MAX_DECOMPRESSED_BYTES
+from static_assets import parse_accept_encoding
+
+
+class DecompressionError(ValueError):
+    """Raised for a corrupt body or an unsupported encoding"""
+
+
+class DecompressedTooLarge(DecompressionError):
+    """Raised when a body inflates past the configured size limit"""
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    """Content-Encodings this process can produce and read, most preferred first"""
+    return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+class CompressionStats:
+    """Thread-safe counters of uncompressed (raw) vs on-the-wire bytes and CPU time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.skipped = 0
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.cpu_seconds = 0.0
+
+    def record(self, raw_bytes: int, wire_bytes: int, cpu_seconds: float):
+        with self._lock:
+            self.compressed += 1
+            self.raw_bytes += raw_bytes
+            self.wire_bytes += wire_bytes
+            self.cpu_seconds += cpu_seconds
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            saved = self.raw_bytes - self.wire_bytes
+            return {
+                "compressed": self.compressed,
+                "skipped": self.skipped,
+                "raw_bytes": self.raw_bytes,
+                "wire_bytes": self.wire_bytes,
+                "bytes_saved": saved,
+                "ratio": self.wire_bytes / self.raw_bytes if self.raw_bytes else 1.0,
+                "cpu_seconds": self.cpu_seconds,
+                # What the threshold trades off: network bytes won per CPU millisecond
+                "bytes_saved_per_cpu_ms": saved / (self.cpu_seconds * 1000) if self.cpu_seconds else 0.0
+            }
+
+
+class Compressor:
+    """Compresses bodies of at least ``min_size`` bytes and decompresses incoming ones.
+
+    Compression and decompression are counted separately; CPU time is
+    measured with the calling thread's CPU clock, so waiting on I/O or other
+    threads is not included.
+    """
+
+    def __init__(self, min_size: int = COMPRESSION_MIN_SIZE, level: int = COMPRESSION_LEVEL,
+                 max_decompressed_bytes: int = COMPRESSION_MAX_DECOMPRESSED_BYTES):
+        self.min_size = min_size
+        self.level = level
+        self.max_decompressed_bytes = max_decompressed_bytes
+        self.compress_stats = CompressionStats()
+        self.decompress_stats = CompressionStats()
+
+    def compress(self, body: bytes, encoding: str) -> Optional[bytes]:
+        """Compressed body, or None if it is below the threshold or would not get smaller"""
+        if len(body) < self.min_size:
+            self.compress_stats.record_skip()
+            return None
+
+        started = time.thread_time()
+        if encoding == "gzip":
+            # mtime=0 so identical bodies compress to identical bytes
+            compressed = gzip.compress(body, compresslevel=min(self.level, 9), mtime=0)
+        elif encoding == "zstd" and zstandard is not None:
+            compressed = zstandard.ZstdCompressor(level=self.level).compress(body)
+        else:
+            raise ValueError(f"Unsupported content encoding '{encoding}'")
+        cpu = time.thread_time() - started
+
+        if len(compressed) >= len(body):
+            self.compress_stats.record_skip()
+            return None
+        self.compress_stats.record(len(body), len(compressed), cpu)
+        return compressed
+
+    def decompress(self, body: bytes, encoding: str) -> bytes:
+        """Decompress a request body, refusing output larger than ``max_decompressed_bytes``"""
+        started = time.thread_time()
+        limit = self.max_decompressed_bytes
+        try:
+            if encoding == "gzip":
+                inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                data = inflater.decompress(body, limit + 1)
+                if not inflater.eof and len(data) <= limit:
+                    raise DecompressionError("Truncated gzip body")
+            elif encoding == "zstd" and zstandard is not None:
+                with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body)) as reader:
+                    data = reader.read(limit + 1)
+            else:
+                raise DecompressionError(f"Unsupported content encoding '{encoding}'")
+        except (zlib.error, EOFError) as e:
+            raise DecompressionError(f"Invalid {encoding} body: {e}")
+        except Exception as e:
+            if zstandard is not None and isinstance(e, zstandard.ZstdError):
+                raise DecompressionError(f"Invalid {encoding} body: {e}")
+            raise
+
+        if len(data) > limit:
+            raise DecompressedTooLarge(f"Decompressed body exceeds {limit} bytes")
+        self.decompress_stats.record(len(data), len(body), time.thread_time() - started)
+        return data
+
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """Preferred encoding the client accepts (q > 0), or None"""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in supported_encodings():
+            if accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding
+        return None
+
+    def get_stats(self) -> Dict:
+        return {
+            "min_size": self.min_size,
+            "level": self.level,
+            "compress": self.compress_stats.snapshot(),
+            "decompress": self.decompress_stats.snapshot()
+        }
+
+
+class DecompressRequestMiddleware:
+    """WSGI middleware that inflates gzip/zstd request bodies before the app reads them"""
+
+    def __init__(self, wsgi_app, compressor: Compressor):
+        self.wsgi_app = wsgi_app
+        self.compressor = compressor
+
+    @staticmethod
+    def _read_body(environ) -> bytes:
+        length = environ.get("CONTENT_LENGTH")
+        if length:
+            return environ["wsgi.input"].read(int(length))
+        if environ.get("wsgi.input_terminated"):
+            # Chunked upload: the server signals the end of the body, so it is safe to read to EOF
+            return environ["wsgi.input"].read()
+        return b""
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding and encoding != "identity":
+            try:
+                body = self.compressor.decompress(self._read_body(environ), encoding)
+            except (DecompressionError, ValueError) as e:
+                status = "413 Payload Too Large" if isinstance(e, DecompressedTooLarge) else "400 Bad Request"
+                payload = json.dumps({"status": "error", "message": str(e)}).encode("utf-8")
+                start_response(status, [("Content-Type", "application/json"),
+                                        ("Content-Length", str(len(payload)))])
+                return [payload]
+            environ["wsgi.input"] = io.BytesIO(body)
+            environ["CONTENT_LENGTH"] = str(len(body))
+            del environ["HTTP_CONTENT_ENCODING"]
+        return self.wsgi_app(environ, start_response)
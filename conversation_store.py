@@ -0,0 +1,185 @@
+"""
+Server-side conversation storage so clients only send the new message
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from config import (CONVERSATION_STORE, CONVERSATION_DB, CONVERSATION_TTL, CONVERSATION_MAX,
+                    CONVERSATION_PURGE_INTERVAL)
+from history import History
+
+
+class MemoryConversationStore:
+    """In-process LRU of conversations with an idle TTL"""
+
+    def __init__(self, ttl: float = CONVERSATION_TTL, max_conversations: int = CONVERSATION_MAX):
+        self.ttl = ttl
+        self.max_conversations = max_conversations
+        self._lock = threading.Lock()
+        self._conversations: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def create(self, messages: Optional[List[Dict]] = None) -> str:
+        conversation_id = uuid.uuid4().hex
+        with self._lock:
+            self._conversations[conversation_id] = {"messages": History(messages or []), "touched": time.time()}
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        return conversation_id
+
+    def _get_live(self, conversation_id: str) -> Optional[Dict]:
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None:
+            return None
+        if time.time() - conversation["touched"] > self.ttl:
+            del self._conversations[conversation_id]
+            return None
+        return conversation
+
+    def get_messages(self, conversation_id: str) -> Optional[Sequence[Dict]]:
+        """Messages of a conversation, or None if it is unknown or expired"""
+        with self._lock:
+            conversation = self._get_live(conversation_id)
+            if conversation is None:
+                return None
+            conversation["touched"] = time.time()
+            self._conversations.move_to_end(conversation_id)
+            # History is immutable, so callers can share the stored one without a copy
+            return conversation["messages"]
+
+    def append(self, conversation_id: str, *messages: Dict) -> bool:
+        """Append messages to a conversation; returns False if it no longer exists"""
+        with self._lock:
+            conversation = self._get_live(conversation_id)
+            if conversation is None:
+                return False
+            conversation["messages"] = conversation["messages"].extend(messages)
+            conversation["touched"] = time.time()
+            self._conversations.move_to_end(conversation_id)
+            return True
+
+    def delete(self, conversation_id: str) -> bool:
+        with self._lock:
+            return self._conversations.pop(conversation_id, None) is not None
+
+
+class SQLiteConversationStore:
+    """Conversations in SQLite; each message is one appended row, so turns never rewrite history"""
+
+    def __init__(self, path: str = CONVERSATION_DB, ttl: float = CONVERSATION_TTL,
+                 purge_interval: float = CONVERSATION_PURGE_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        # Expired conversations are purged at startup and then at most this often, from create/append
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._connection = None
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                touched REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_by_conversation ON messages (conversation_id, id);
+        """)
+        self._conn.commit()
+        self.purge_expired()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # SQLite connections must not cross fork(), so each worker process opens its own
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    def create(self, messages: Optional[List[Dict]] = None) -> str:
+        conversation_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("INSERT INTO conversations (id, touched) VALUES (?, ?)", (conversation_id, time.time()))
+            self._insert(conversation_id, messages or [])
+            self._conn.commit()
+        self._maybe_purge()
+        return conversation_id
+
+    def _insert(self, conversation_id: str, messages):
+        self._conn.executemany(
+            "INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)",
+            [(conversation_id, m["role"], m["content"]) for m in messages]
+        )
+
+    def _touch(self, conversation_id: str) -> bool:
+        """Refresh a live conversation's TTL; returns False if it is unknown or expired"""
+        cursor = self._conn.execute(
+            "UPDATE conversations SET touched = ? WHERE id = ? AND touched > ?",
+            (time.time(), conversation_id, time.time() - self.ttl)
+        )
+        return cursor.rowcount > 0
+
+    def get_messages(self, conversation_id: str) -> Optional[List[Dict]]:
+        with self._lock:
+            if not self._touch(conversation_id):
+                return None
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE conversation_id = ? ORDER BY id", (conversation_id,)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def append(self, conversation_id: str, *messages: Dict) -> bool:
+        with self._lock:
+            if not self._touch(conversation_id):
+                return False
+            self._insert(conversation_id, messages)
+            self._conn.commit()
+        self._maybe_purge()
+        return True
+
+    def delete(self, conversation_id: str) -> bool:
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+            cursor = self._conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def _maybe_purge(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_purge < self.purge_interval:
+                return
+            self._last_purge = now
+        self.purge_expired()
+
+    def purge_expired(self):
+        """Delete conversations idle for longer than the TTL"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            self._last_purge = time.monotonic()
+            self._conn.execute(
+                "DELETE FROM messages WHERE conversation_id IN (SELECT id FROM conversations WHERE touched <= ?)",
+                (cutoff,)
+            )
+            self._conn.execute("DELETE FROM conversations WHERE touched <= ?", (cutoff,))
+            self._conn.commit()
+
+
+def create_conversation_store(backend: str = CONVERSATION_STORE):
+    """Build the configured conversation store ("memory" or "sqlite")"""
+    if backend == "sqlite":
+        return SQLiteConversationStore()
+    if backend == "memory":
+        return MemoryConversationStore()
+    raise ValueError(f"Unknown conversation store '{backend}', expected 'memory' or 'sqlite'")
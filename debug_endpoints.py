@@ -3,139 +3,127 @@
 Debug script to find the correct API endpoints for the LLAMA service
 """
 
-import requests
+import argparse
 import json
+import time
 from llama_client import LlamaClient
+from probe_engine import ProbeEngine, make_probe, write_report
+from config import PROBE_DEADLINE
 
-def debug_service_endpoints():
-    """Debug the service endpoints to find the correct ones"""
+# Paths probed with GET
+GET_ENDPOINTS = [
+    "/",
+    "/health",
+    "/status",
+    "/ping",
+    "/api/health",
+    "/v1/health",
+    "/models",
+    "/v1/models",
+    "/api/models",
+    "/chat/completions",
+    "/v1/chat/completions",
+    "/api/chat/completions",
+    "/completions",
+    "/v1/completions"
+]
+
+# Paths probed with a small chat payload
+POST_ENDPOINTS = [
+    "/chat/completions",
+    "/v1/chat/completions",
+    "/api/chat/completions",
+    "/completions",
+    "/v1/completions"
+]
+
+TEST_PAYLOAD = {
+    "messages": [{"role": "user", "content": "Hello"}],
+    "max_tokens": 10
+}
+
+def print_result(result):
+    """Print one probe result as soon as it finishes"""
+    label = "POST" if result["method"] == "POST" else "GET"
+    print(f"🔧 {label} {result['name']} ({result['elapsed'] or 0:.2f}s)")
+
+    if result["outcome"] != "ok":
+        print(f"   ❌ {result['outcome'].capitalize()}: {result['error']}")
+        print()
+        return
+
+    status = result["status_code"]
+    print(f"   Status: {status}")
+    print(f"   Content-Type: {result['content_type'] or 'Unknown'}")
+
+    if status == 200:
+        print("   ✅ SUCCESS!")
+        if "response_json" in result:
+            print(f"   Response: {json.dumps(result['response_json'], indent=2)[:200]}...")
+        else:
+            print(f"   Response: {result['body_preview']}...")
+    elif status == 404:
+        print("   ❌ Not Found")
+    elif status == 405:
+        print("   ❌ Method Not Allowed (try POST instead of GET)")
+    else:
+        print(f"   ❌ Error: {status}")
+        print(f"   Response: {result['body_preview']}...")
+    print()
+
+def debug_service_endpoints(engine=None):
+    """Probe the service endpoints concurrently; returns the list of results"""
     print("🔍 Debugging LLAMA Service Endpoints")
     print("=" * 50)
-    
+
     try:
         # Initialize client
         client = LlamaClient()
         client.ensure_valid_token()
-        
-        headers = {
-            "Authorization": f"Bearer {client.access_token}",
-            "Ocp-Apim-Subscription-Key": client.subscription_key,
-            "Content-Type": "application/json"
-        }
-        
-        # Test different endpoints
-        endpoints_to_test = [
-            "/",
-            "/health",
-            "/status",
-            "/ping",
-            "/api/health",
-            "/v1/health",
-            "/models",
-            "/v1/models",
-            "/api/models",
-            "/chat/completions",
-            "/v1/chat/completions",
-            "/api/chat/completions",
-            "/completions",
-            "/v1/completions"
-        ]
-        
-        print("Testing different endpoints...")
-        print()
-        
-        for endpoint in endpoints_to_test:
-            try:
-                url = f"{client.base_url}{endpoint}"
-                print(f"🔧 Testing: {endpoint}")
-                
-                response = requests.get(url, headers=headers, timeout=10)
-                
-                print(f"   Status: {response.status_code}")
-                print(f"   Content-Type: {response.headers.get('content-type', 'Unknown')}")
-                
-                if response.status_code == 200:
-                    print("   ✅ SUCCESS!")
-                    try:
-                        # Try to parse as JSON
-                        data = response.json()
-                        print(f"   Response: {json.dumps(data, indent=2)[:200]}...")
-                    except:
-                        # If not JSON, show first 200 chars
-                        print(f"   Response: {response.text[:200]}...")
-                elif response.status_code == 404:
-                    print("   ❌ Not Found")
-                elif response.status_code == 405:
-                    print("   ❌ Method Not Allowed (try POST instead of GET)")
-                else:
-                    print(f"   ❌ Error: {response.status_code}")
-                    print(f"   Response: {response.text[:200]}...")
-                
-                print()
-                
-            except requests.exceptions.Timeout:
-                print(f"   ❌ Timeout")
-                print()
-            except Exception as e:
-                print(f"   ❌ Error: {e}")
-                print()
-        
-        # Test POST endpoints for chat
-        print("🔍 Testing POST endpoints for chat...")
-        print()
-        
-        post_endpoints = [
-            "/chat/completions",
-            "/v1/chat/completions", 
-            "/api/chat/completions",
-            "/completions",
-            "/v1/completions"
-        ]
-        
-        test_payload = {
-            "messages": [{"role": "user", "content": "Hello"}],
-            "max_tokens": 10
-        }
-        
-        for endpoint in post_endpoints:
-            try:
-                url = f"{client.base_url}{endpoint}"
-                print(f"🔧 Testing POST: {endpoint}")
-                
-                response = requests.post(url, headers=headers, json=test_payload, timeout=10)
-                
-                print(f"   Status: {response.status_code}")
-                print(f"   Content-Type: {response.headers.get('content-type', 'Unknown')}")
-                
-                if response.status_code == 200:
-                    print("   ✅ SUCCESS!")
-                    try:
-                        data = response.json()
-                        print(f"   Response: {json.dumps(data, indent=2)[:200]}...")
-                    except:
-                        print(f"   Response: {response.text[:200]}...")
-                else:
-                    print(f"   ❌ Error: {response.status_code}")
-                    print(f"   Response: {response.text[:200]}...")
-                
-                print()
-                
-            except requests.exceptions.Timeout:
-                print(f"   ❌ Timeout")
-                print()
-            except Exception as e:
-                print(f"   ❌ Error: {e}")
-                print()
-                
     except Exception as e:
         print(f"❌ Error initializing client: {e}")
+        return []
+
+    headers = {
+        "Authorization": f"Bearer {client.access_token}",
+        "Ocp-Apim-Subscription-Key": client.subscription_key,
+        "Content-Type": "application/json"
+    }
+
+    probes = [make_probe(endpoint, f"{client.base_url}{endpoint}", headers=headers)
+              for endpoint in GET_ENDPOINTS]
+    probes += [make_probe(endpoint, f"{client.base_url}{endpoint}", method="POST", headers=headers,
+                          json_body=TEST_PAYLOAD)
+               for endpoint in POST_ENDPOINTS]
+
+    engine = engine or ProbeEngine()
+    print(f"Testing {len(probes)} endpoints ({engine.max_workers} at a time, {engine.deadline:.0f}s deadline)...")
+    print()
+
+    results = []
+    for result in engine.run(probes):
+        print_result(result)
+        results.append(result)
+    return results
 
 def main():
-    debug_service_endpoints()
-    
+    parser = argparse.ArgumentParser(description="Probe LLAMA service endpoints")
+    parser.add_argument("--report", help="Write a JSON report of all probe results to this file")
+    parser.add_argument("--deadline", type=float, default=PROBE_DEADLINE, help="Seconds allowed for the whole run")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    results = debug_service_endpoints(ProbeEngine(deadline=args.deadline))
+    elapsed = time.monotonic() - started
+
     print("=" * 50)
     print("📋 SUMMARY")
     print("=" * 50)
+    working = [r for r in results if r["status_code"] == 200]
+    print(f"⏱️  {len(results)} probes in {elapsed:.1f}s, {len(working)} returned 200")
+    for result in working:
+        print(f"   ✅ {result['method']} {result['name']}")
+    print()
     print("💡 Look for endpoints that return:")
     print("   - Status 200 with JSON response")
     print("   - Models endpoint that lists available models")
@@ -143,5 +131,9 @@ def main():
     print()
     print("💡 Update your llama_client.py with the correct endpoints")
 
+    if args.report:
+        write_report(args.report, results, elapsed, script="debug_endpoints")
+        print(f"📝 Report written to {args.report}")
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
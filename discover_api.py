@@ -3,12 +3,36 @@
 Discover the correct API endpoint and configuration
 """
 
-import requests
+import argparse
 import json
-from config import BASE_URL, CLIENT_ID, CLIENT_SECRET, APIM_SUBSCRIPTION_KEY
+import time
+from config import BASE_URL, CLIENT_ID, CLIENT_SECRET, APIM_SUBSCRIPTION_KEY, PROBE_DEADLINE
+from probe_engine import ProbeEngine, make_probe, write_report
 
-def discover_api_endpoints():
-    """Try to discover the correct API endpoints"""
+def describe_response(result):
+    """One-line verdict for a probe result, in the style of the original checks"""
+    if result["outcome"] != "ok":
+        return f"❌ {result['outcome'].capitalize()}: {result['error']}"
+    status = result["status_code"]
+    content_type = result["content_type"] or ""
+    if status == 200:
+        if 'application/json' in content_type:
+            if "response_json" in result:
+                return f"✅ JSON Response! {json.dumps(result['response_json'])[:200]}..."
+            return "✅ JSON Response! (could not parse JSON)"
+        if 'text/html' in content_type:
+            if 'Sign in to your account' in (result["body_preview"] or ""):
+                return "❌ Login page"
+            return "⚠️  HTML (not login page)"
+        return f"Response: {(result['body_preview'] or '')[:100]}..."
+    if status == 401:
+        return "❌ Unauthorized"
+    if status == 404:
+        return "❌ Not Found"
+    return f"❌ Error: {status}"
+
+def discover_api_endpoints(engine=None):
+    """Try to discover the correct API endpoints; returns the probe results"""
     print("🔍 Discovering API Endpoints")
     print("=" * 50)
     
@@ -36,60 +60,33 @@ def discover_api_endpoints():
         "/completions"
     ]
     
-    print("Testing different base URLs and paths...")
+    # Try with subscription key only first
+    headers = {
+        "Ocp-Apim-Subscription-Key": APIM_SUBSCRIPTION_KEY,
+        "Content-Type": "application/json"
+    }
+    probes = [
+        make_probe(f"{base_url}{path}/models", f"{base_url}{path}/models", headers=headers,
+                   base_url=base_url, path=path)
+        for base_url in dict.fromkeys(base_urls_to_test)
+        for path in path_patterns
+    ]
+
+    engine = engine or ProbeEngine()
+    print(f"Testing {len(probes)} base URL and path combinations ({engine.max_workers} at a time)...")
     print()
-    
-    for base_url in base_urls_to_test:
-        print(f"🔧 Testing base URL: {base_url}")
-        print("-" * 40)
-        
-        for path in path_patterns:
-            try:
-                url = f"{base_url}{path}/models"
-                
-                # Try with subscription key only first
-                headers = {
-                    "Ocp-Apim-Subscription-Key": APIM_SUBSCRIPTION_KEY,
-                    "Content-Type": "application/json"
-                }
-                
-                response = requests.get(url, headers=headers, timeout=10)
-                
-                print(f"   {path}/models: Status {response.status_code}")
-                
-                if response.status_code == 200:
-                    content_type = response.headers.get('content-type', '')
-                    if 'application/json' in content_type:
-                        print("   ✅ JSON Response!")
-                        try:
-                            data = response.json()
-                            print(f"   Response: {json.dumps(data, indent=2)[:200]}...")
-                        except:
-                            print("   Response: Could not parse JSON")
-                    elif 'text/html' in content_type:
-                        if 'Sign in to your account' in response.text:
-                            print("   ❌ Login page")
-                        else:
-                            print("   ⚠️  HTML (not login page)")
-                    else:
-                        print(f"   Response: {response.text[:100]}...")
-                elif response.status_code == 401:
-                    print("   ❌ Unauthorized")
-                elif response.status_code == 404:
-                    print("   ❌ Not Found")
-                else:
-                    print(f"   ❌ Error: {response.status_code}")
-                
-                print()
-                
-            except Exception as e:
-                print(f"   ❌ Error: {e}")
-                print()
-        
+
+    # Results arrive in completion order, so each line names its URL
+    results = []
+    for result in engine.run(probes):
+        print(f"   {result['url']}: Status {result['status_code'] or '-'}")
+        print(f"   {describe_response(result)}")
         print()
+        results.append(result)
+    return results
 
-def test_different_auth_methods():
-    """Test different authentication methods"""
+def test_different_auth_methods(engine=None):
+    """Test different authentication methods; returns the probe results"""
     print("🔍 Testing Different Authentication Methods")
     print("=" * 50)
     
@@ -124,47 +121,48 @@ def test_different_auth_methods():
         }
     ]
     
-    for method in auth_methods:
-        try:
-            print(f"🔧 Testing: {method['name']}")
-            response = requests.get(url, headers=method["headers"], timeout=10)
-            
-            print(f"   Status: {response.status_code}")
-            print(f"   Content-Type: {response.headers.get('content-type', 'Unknown')}")
-            
-            if response.status_code == 200:
-                content_type = response.headers.get('content-type', '')
-                if 'application/json' in content_type:
-                    print("   ✅ JSON Response!")
-                elif 'text/html' in content_type:
-                    if 'Sign in to your account' in response.text:
-                        print("   ❌ Login page")
-                    else:
-                        print("   ⚠️  HTML (not login page)")
-                else:
-                    print(f"   Response: {response.text[:100]}...")
-            else:
-                print(f"   ❌ Error: {response.status_code}")
-                print(f"   Response: {response.text[:100]}...")
-            
-            print()
-            
-        except Exception as e:
-            print(f"   ❌ Error: {e}")
-            print()
+    probes = [make_probe(method["name"], url, headers=method["headers"], auth_method=method["name"])
+              for method in auth_methods]
+
+    results = []
+    for result in (engine or ProbeEngine()).run(probes):
+        print(f"🔧 Testing: {result['name']}")
+        print(f"   Status: {result['status_code'] or '-'}")
+        print(f"   Content-Type: {result['content_type'] or 'Unknown'}")
+        print(f"   {describe_response(result)}")
+        print()
+        results.append(result)
+    return results
 
 def main():
-    discover_api_endpoints()
-    test_different_auth_methods()
-    
+    parser = argparse.ArgumentParser(description="Discover the LLAMA API endpoint and authentication")
+    parser.add_argument("--report", help="Write a JSON report of all probe results to this file")
+    parser.add_argument("--deadline", type=float, default=PROBE_DEADLINE, help="Seconds allowed for each probe run")
+    args = parser.parse_args()
+
+    engine = ProbeEngine(deadline=args.deadline)
+    started = time.monotonic()
+    results = discover_api_endpoints(engine)
+    results += test_different_auth_methods(engine)
+    elapsed = time.monotonic() - started
+
     print("=" * 50)
     print("📋 SUMMARY")
     print("=" * 50)
+    json_hits = [r for r in results if r["status_code"] == 200 and "application/json" in (r["content_type"] or "")]
+    print(f"⏱️  {len(results)} probes in {elapsed:.1f}s, {len(json_hits)} returned JSON")
+    for result in json_hits:
+        print(f"   ✅ {result['url']}")
+    print()
     print("💡 If no JSON responses found, you may need to:")
     print("   1. Ask your Azure administrator for the correct API endpoint")
     print("   2. Check if the service requires different authentication")
     print("   3. Verify the API gateway configuration")
     print("   4. Check if there's a different service URL")
 
+    if args.report:
+        write_report(args.report, results, elapsed, script="discover_api")
+        print(f"📝 Report written to {args.report}")
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -3,30 +3,23 @@
 Diagnostic script to help find the correct scope and tenant ID for Azure AD authentication
 """
 
-import msal
-import requests
-from config import CLIENT_ID, CLIENT_SECRET, AUTH_URI
+import argparse
+from config import CLIENT_ID, CLIENT_SECRET, AUTH_URI, AUTH_DISCOVERY_CACHE_FILE
+from auth_discovery import AuthDiscovery
 
 def test_authentication_with_scope(scope, tenant_id="common"):
     """Test authentication with a specific scope and tenant ID"""
-    try:
-        app = msal.ConfidentialClientApplication(
-            client_id=CLIENT_ID,
-            client_credential=CLIENT_SECRET,
-            authority=f"{AUTH_URI}/{tenant_id}"
-        )
-        
-        result = app.acquire_token_for_client(scopes=[scope])
-        
-        if "access_token" in result:
-            return True, "Success", result.get("access_token", "")[:50] + "..."
-        else:
-            return False, result.get('error_description', 'Unknown error'), None
-            
-    except Exception as e:
-        return False, str(e), None
+    discovery = AuthDiscovery(CLIENT_ID, CLIENT_SECRET, AUTH_URI, cache_file=None)
+    result = discovery.try_candidate(tenant_id, scope)
+    return result["success"], result["message"], result["token_preview"]
 
 def main():
+    parser = argparse.ArgumentParser(description="Find a working Azure AD tenant and scope")
+    parser.add_argument("--all", action="store_true",
+                        help="Test every combination instead of stopping at the first success")
+    parser.add_argument("--no-cache", action="store_true", help="Retry combinations that failed on earlier runs")
+    args = parser.parse_args()
+
     print("🔍 Azure AD Scope and Tenant ID Diagnostic")
     print("=" * 50)
     
@@ -53,23 +46,36 @@ def main():
     print()
     
     successful_combinations = []
+    skipped = 0
+    
+    cache_file = None if args.no_cache else AUTH_DISCOVERY_CACHE_FILE
+    discovery = AuthDiscovery(CLIENT_ID, CLIENT_SECRET, AUTH_URI, cache_file=cache_file)
+    candidates = [(tenant_id, scope) for tenant_id in tenant_ids_to_test for scope in scopes_to_test]
     
-    for tenant_id in tenant_ids_to_test:
-        print(f"🔧 Testing with Tenant ID: {tenant_id}")
-        print("-" * 30)
+    # Results arrive as each token request finishes, so every line names its tenant
+    for result in discovery.run(candidates, stop_on_success=not args.all):
+        if result["skipped"]:
+            skipped += 1
+            continue
         
-        for scope in scopes_to_test:
-            success, message, token_preview = test_authentication_with_scope(scope, tenant_id)
-            
-            status = "✅ SUCCESS" if success else "❌ FAILED"
-            print(f"{status} | Scope: {scope}")
-            print(f"   Message: {message}")
-            if token_preview:
-                print(f"   Token: {token_preview}")
-            print()
-            
-            if success:
-                successful_combinations.append((scope, tenant_id, message))
+        if result["success"]:
+            status = "✅ SUCCESS"
+        elif result["cached"]:
+            status = "⏭️  KNOWN FAILURE"
+        else:
+            status = "❌ FAILED"
+        print(f"{status} | Tenant: {result['tenant']} | Scope: {result['scope']}")
+        print(f"   Message: {result['message']}")
+        if result["token_preview"]:
+            print(f"   Token: {result['token_preview']}")
+        print()
+        
+        if result["success"]:
+            successful_combinations.append((result["scope"], result["tenant"], result["message"]))
+    
+    if skipped:
+        print(f"⏭️  Stopped early; {skipped} remaining combinations were not tested (use --all to test them)")
+        print()
     
     print("=" * 50)
     print("📋 SUMMARY")
@@ -1,6 +1,7 @@
 // Global variables
 let isConnected = false;
 let conversationHistory = [];
+let conversationId = null;
 let messageCount = 0;
 let userMessageCount = 0;
 let assistantMessageCount = 0;
@@ -177,6 +178,9 @@ async function sendMessage() {
     const message = elements.messageInput.value.trim();
     if (!message || !isConnected) return;
     
+    // Only needed if the server has to be re-seeded with the full history
+    const historyBeforeMessage = conversationHistory.length;
+    
     // Add user message to chat
     addMessageToChat('user', message);
     elements.messageInput.value = '';
@@ -186,24 +190,22 @@ async function sendMessage() {
     showTypingIndicator();
     
     try {
-        const response = await fetch('/api/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                message: message,
-                conversation_history: conversationHistory
-            })
-        });
+        let response = await postChatMessage(message, historyBeforeMessage);
         
-        const result = await response.json();
+        if (response.status === 404 && conversationId) {
+            // The server forgot the conversation (restart or expiry): start a new one from our copy
+            conversationId = null;
+            response = await postChatMessage(message, historyBeforeMessage);
+        }
         
-        if (result.status === 'success') {
-            addMessageToChat('assistant', result.message);
-        } else {
+        if (!response.ok || !response.body) {
+            const result = await response.json();
             addMessageToChat('assistant', `Error: ${result.message}`, true);
+            return;
         }
+        
+        conversationId = response.headers.get('X-Conversation-Id') || conversationId;
+        await renderStreamedReply(response);
     } catch (error) {
         console.error('Chat error:', error);
         addMessageToChat('assistant', 'Error: Unable to send message', true);
@@ -212,7 +214,85 @@ async function sendMessage() {
     }
 }
 
+function postChatMessage(message, historyLength) {
+    // With a server-side conversation only the new message is uploaded
+    const body = conversationId
+        ? { message: message, conversation_id: conversationId }
+        : { message: message, conversation_history: conversationHistory.slice(0, historyLength) };
+    
+    return fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
+        },
+        body: JSON.stringify(body)
+    });
+}
+
+async function renderStreamedReply(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let bubble = null;
+    let content = '';
+    let finished = false;
+    
+    while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        
+        // SSE frames are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            const data = frame.split('\n')
+                .filter(line => line.startsWith('data:'))
+                .map(line => line.slice(5).trim())
+                .join('');
+            if (!data) continue;
+            
+            const event = JSON.parse(data);
+            if (event.status === 'delta') {
+                if (!bubble) {
+                    // First token: swap the typing indicator for the reply bubble
+                    hideTypingIndicator();
+                    bubble = createMessageElement('assistant', '');
+                }
+                content += event.content;
+                bubble.textContent = content;
+                elements.chatMessages.scrollTop = elements.chatMessages.scrollHeight;
+            } else if (event.status === 'success') {
+                content = event.message || content;
+                finished = true;
+            } else {
+                if (bubble) {
+                    bubble.textContent = content;
+                }
+                addMessageToChat('assistant', `Error: ${event.message}`, true);
+                return;
+            }
+        }
+    }
+    
+    if (bubble) {
+        bubble.textContent = content;
+        recordMessage('assistant', content);
+    } else {
+        addMessageToChat('assistant', content);
+    }
+}
+
 function addMessageToChat(role, content, isError = false) {
+    createMessageElement(role, content, isError);
+    recordMessage(role, content);
+}
+
+function createMessageElement(role, content, isError = false) {
     const messageDiv = document.createElement('div');
     messageDiv.className = `message ${role}`;
     
@@ -248,6 +328,10 @@ function addMessageToChat(role, content, isError = false) {
     elements.chatMessages.appendChild(messageDiv);
     elements.chatMessages.scrollTop = elements.chatMessages.scrollHeight;
     
+    return messageText;
+}
+
+function recordMessage(role, content) {
     // Update conversation history
     conversationHistory.push({
         role: role,
@@ -297,7 +381,11 @@ function clearChat() {
             </div>
         `;
         
+        if (conversationId) {
+            fetch(`/api/conversations/${conversationId}`, { method: 'DELETE' }).catch(() => {});
+        }
         conversationHistory = [];
+        conversationId = null;
         messageCount = 0;
         userMessageCount = 0;
         assistantMessageCount = 0;
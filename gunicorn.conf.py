@@ -0,0 +1,43 @@
+"""
+gunicorn settings for serving app.py in production (see `start_server.py --production`)
+
+Command-line flags passed to gunicorn override these values.
+"""
+
+from config import (SERVER_BIND, SERVER_WORKERS, SERVER_THREADS, SERVER_BACKLOG, SERVER_TIMEOUT,
+                    SERVER_GRACEFUL_TIMEOUT, SERVER_KEEPALIVE, SERVER_MAX_REQUESTS)
+
+wsgi_app = "app:app"
+bind = SERVER_BIND
+workers = SERVER_WORKERS
+threads = SERVER_THREADS
+worker_class = "gthread"
+backlog = SERVER_BACKLOG
+timeout = SERVER_TIMEOUT
+graceful_timeout = SERVER_GRACEFUL_TIMEOUT
+keepalive = SERVER_KEEPALIVE
+
+# Recycle workers gradually so long-running processes cannot slowly leak memory
+max_requests = SERVER_MAX_REQUESTS
+max_requests_jitter = SERVER_MAX_REQUESTS // 10
+
+# Import the app (and pay the import cost) once in the master, then fork
+preload_app = True
+
+accesslog = "-"
+
+
+def when_ready(server):
+    """Fetch the access token in the master so every worker starts with it"""
+    import app
+    try:
+        app.warm_up()
+        server.log.info("Access token acquired before forking workers")
+    except Exception as e:
+        server.log.warning(f"Token warm-up failed, workers will authenticate on demand: {e}")
+
+
+def post_fork(server, worker):
+    """Timer threads do not survive fork, so re-arm background token refresh per worker"""
+    import app
+    app.get_llama_client().token_provider.resume_after_fork()
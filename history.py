@@ -0,0 +1,252 @@
+"""
+Conversation-history token budgeting and truncation
+"""
+
+import threading
+from collections.abc import Sequence
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Union
+
+from config import HISTORY_MAX_CONTEXT_TOKENS, HISTORY_STRATEGY, HISTORY_KEEP_LAST_TURNS
+
+# Per-message overhead of the chat format (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+STRATEGIES = ("sliding_window", "system_plus_last_n", "none")
+
+
+@lru_cache(maxsize=8192)
+def _estimate_text_tokens(text: str) -> int:
+    # ~4 characters per token for English text; cheap and close enough for budgeting
+    return (len(text) + 3) // 4
+
+
+class _Storage:
+    """Backing list shared by every History version derived from it.
+
+    ``tokens[i]`` and ``pins[i]`` are the estimated token total and pinned
+    message count of ``items[:i + 1]``, so any prefix can be budgeted in O(1).
+    """
+
+    __slots__ = ("items", "tokens", "pins", "lock")
+
+    def __init__(self, items: List[Dict]):
+        self.items = []
+        self.tokens = []
+        self.pins = []
+        self.lock = threading.Lock()
+        self.add(items)
+
+    def add(self, messages: List[Dict]):
+        tokens = self.tokens[-1] if self.tokens else 0
+        pins = self.pins[-1] if self.pins else 0
+        for message in messages:
+            tokens += estimate_message_tokens(message)
+            pins += 1 if message.get("pinned") else 0
+            self.tokens.append(tokens)
+            self.pins.append(pins)
+        self.items.extend(messages)
+
+
+class History(Sequence):
+    """Immutable, append-only list of chat messages with structural sharing.
+
+    ``append`` and ``extend`` return a new History and leave the original
+    untouched. Versions share one backing list: each sees only its own prefix,
+    and adding to the newest version just appends to that list (amortised
+    O(1)). Adding to an older version copies its prefix once to start a new
+    branch. Messages themselves are shared, not copied, and must not be mutated.
+    """
+
+    __slots__ = ("_storage", "_length")
+
+    def __init__(self, messages: Iterable[Dict] = ()):
+        self._storage = _Storage(list(messages))
+        self._length = len(self._storage.items)
+
+    @classmethod
+    def _view(cls, storage: _Storage, length: int) -> "History":
+        history = cls.__new__(cls)
+        history._storage = storage
+        history._length = length
+        return history
+
+    @classmethod
+    def of(cls, messages: Iterable[Dict]) -> "History":
+        """``messages`` itself if it is already a History, otherwise a History holding a copy"""
+        return messages if isinstance(messages, History) else cls(messages)
+
+    def extend(self, messages: Iterable[Dict]) -> "History":
+        new = list(messages)
+        storage = self._storage
+        with storage.lock:
+            if len(storage.items) == self._length:
+                storage.add(new)
+                return History._view(storage, self._length + len(new))
+        # Someone already extended this version, so branch off a copy of our prefix
+        branch = _Storage([])
+        branch.items = storage.items[:self._length]
+        branch.tokens = storage.tokens[:self._length]
+        branch.pins = storage.pins[:self._length]
+        branch.add(new)
+        return History._view(branch, len(branch.items))
+
+    def append(self, message: Dict) -> "History":
+        return self.extend((message,))
+
+    def shares_storage(self, other: "History") -> bool:
+        """True if both versions use the same backing list (neither was branched off by a copy)"""
+        return isinstance(other, History) and other._storage is self._storage
+
+    def estimated_tokens(self) -> int:
+        """Sum of estimate_message_tokens over the messages, without rescanning them"""
+        return self._storage.tokens[self._length - 1] if self._length else 0
+
+    def has_pins(self) -> bool:
+        return bool(self._length and self._storage.pins[self._length - 1])
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[Dict]:
+        return islice(self._storage.items, self._length)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return self._storage.items[:self._length][index]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("History index out of range")
+        return self._storage.items[index]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (History, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"History({list(self)!r})"
+
+
+class MessagesView(Sequence):
+    """Read-only ``messages`` followed by ``tail``, without copying or touching either.
+
+    Used for outgoing payloads so the caller's history (and its History
+    storage) is left exactly as it was; the caller's own next append then
+    stays on the O(1) path instead of branching a copy.
+    """
+
+    __slots__ = ("_messages", "_tail")
+
+    def __init__(self, messages: Sequence[Dict], *tail: Dict):
+        self._messages = messages
+        self._tail = tail
+
+    def __len__(self) -> int:
+        return len(self._messages) + len(self._tail)
+
+    def __iter__(self) -> Iterator[Dict]:
+        yield from self._messages
+        yield from self._tail
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("MessagesView index out of range")
+        head = len(self._messages)
+        return self._messages[index] if index < head else self._tail[index - head]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Sequence) and not isinstance(other, (str, bytes)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"MessagesView({list(self)!r})"
+
+
+def estimate_message_tokens(message: Dict) -> int:
+    """Estimated token count of one chat message (cached per message content)"""
+    return _estimate_text_tokens(str(message.get("content", ""))) + MESSAGE_OVERHEAD_TOKENS
+
+
+class HistoryManager:
+    """Keeps conversation history inside a context-token budget.
+
+    Strategies:
+      - ``sliding_window``: keep system messages and drop the oldest other
+        messages until the rest fit
+      - ``system_plus_last_n``: keep system messages plus the last N turns,
+        then drop the oldest of those turns if they still do not fit
+      - ``none``: send the history unchanged
+
+    Messages with ``"pinned": True`` are always kept. The flag itself is never
+    sent upstream, whatever the strategy.
+    """
+
+    def __init__(self,
+                 max_context_tokens: int = HISTORY_MAX_CONTEXT_TOKENS,
+                 strategy: str = HISTORY_STRATEGY,
+                 keep_last_turns: int = HISTORY_KEEP_LAST_TURNS):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown history strategy '{strategy}', expected one of {', '.join(STRATEGIES)}")
+        self.max_context_tokens = max_context_tokens
+        self.strategy = strategy
+        self.keep_last_turns = keep_last_turns
+
+    def fit(self, messages: Sequence[Dict], reserve_tokens: int = 0) -> Sequence[Dict]:
+        """Return the messages to send, leaving ``reserve_tokens`` for the new message and completion.
+
+        The input sequence is returned unchanged (not copied) when nothing
+        needs to be dropped; otherwise a new list is returned.
+        """
+        if not messages:
+            return messages
+        has_pins = messages.has_pins() if isinstance(messages, History) else any(m.get("pinned") for m in messages)
+        if self.strategy == "none":
+            return [self._strip(m) for m in messages] if has_pins else messages
+
+        budget = self.max_context_tokens - reserve_tokens
+        # A History keeps running totals, so the common "everything fits" case is O(1)
+        if (isinstance(messages, History) and self.strategy == "sliding_window" and not has_pins
+                and messages.estimated_tokens() <= budget):
+            return messages
+        costs = [estimate_message_tokens(m) for m in messages]
+        if sum(costs) <= budget and self.strategy == "sliding_window" and not has_pins:
+            return messages
+
+        keep = set()
+        used = 0
+        for i, message in enumerate(messages):
+            # The system prompt outlives any turn, as losing it changes how every reply is written
+            if message.get("pinned") or message.get("role") == "system":
+                keep.add(i)
+                used += costs[i]
+
+        first_candidate = 0
+        if self.strategy == "system_plus_last_n":
+            first_candidate = max(len(messages) - self.keep_last_turns * 2, 0)
+
+        # Newest first, so the most recent context survives
+        for i in range(len(messages) - 1, first_candidate - 1, -1):
+            if i in keep:
+                continue
+            if used + costs[i] > budget:
+                break
+            keep.add(i)
+            used += costs[i]
+
+        if len(keep) == len(messages) and not has_pins:
+            return messages
+        return [self._strip(messages[i]) for i in sorted(keep)]
+
+    @staticmethod
+    def _strip(message: Dict) -> Dict:
+        if "pinned" not in message:
+            return message
+        return {k: v for k, v in message.items() if k != "pinned"}
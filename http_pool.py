@@ -0,0 +1,200 @@
+"""
+Pooled keep-alive HTTP sessions for talking to the Flamingo gateway
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from metrics import UPSTREAM_CONNECT_SECONDS
+from config import HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_KEEP_ALIVE, HTTP_POOL_IDLE_TIMEOUT
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def is_connect_error(error: requests.exceptions.ConnectionError) -> bool:
+    """True if the connection was never established, so no part of the request was sent"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class PoolStats:
+    """Thread-safe counters for connection reuse"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.reaped_pools = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def record_reaped(self, count: int):
+        with self._lock:
+            self.reaped_pools += count
+
+    def snapshot(self) -> Dict:
+        """Return a copy of the counters; a hit is a request served on a reused connection"""
+        with self._lock:
+            misses = min(self.new_connections, self.requests)
+            return {
+                "requests": self.requests,
+                "hits": self.requests - misses,
+                "misses": misses,
+                "hit_rate": (self.requests - misses) / self.requests if self.requests else 0.0,
+                "reaped_pools": self.reaped_pools
+            }
+
+
+def timed_connection_class(base, stats: PoolStats):
+    """urllib3 connection class that counts every connect() (TCP plus TLS) and records how long it takes.
+
+    Counting here rather than in the pool's _new_conn also catches pooled
+    connection objects that urllib3 reconnects after their socket was closed.
+    """
+    def connect(conn):
+        stats.record_new_connection()
+        started = time.perf_counter()
+        try:
+            return base.connect(conn)
+        finally:
+            UPSTREAM_CONNECT_SECONDS.observe(time.perf_counter() - started)
+    return type(f"Timed{base.__name__}", (base,), {"connect": connect})
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools report every connection opened and its connect time"""
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.stats
+
+        def counting_pool_class(base):
+            return type(f"Counting{base.__name__}", (base,), {
+                "ConnectionCls": timed_connection_class(base.ConnectionCls, stats)
+            })
+
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: counting_pool_class(pool_class)
+            for scheme, pool_class in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+
+class PooledSession:
+    """A requests.Session with bounded per-host pools, keep-alive and idle reaping.
+
+    urllib3 pools are thread-safe, so one PooledSession can be shared by all
+    threads of a process. Pools for hosts that have been idle longer than
+    ``idle_timeout`` seconds are closed on the next request.
+    """
+
+    def __init__(self,
+                 pool_connections: int = HTTP_POOL_CONNECTIONS,
+                 pool_maxsize: int = HTTP_POOL_MAXSIZE,
+                 keep_alive: bool = HTTP_KEEP_ALIVE,
+                 idle_timeout: float = HTTP_POOL_IDLE_TIMEOUT):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
+        self.stats = PoolStats()
+
+        self._lock = threading.Lock()
+        self._last_used: Dict[Tuple[str, str, int], float] = {}
+        self._last_reap = time.monotonic()
+
+        self.adapter = CountingHTTPAdapter(
+            self.stats,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=False
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.session.headers["Connection"] = "keep-alive" if keep_alive else "close"
+
+    @staticmethod
+    def _host_key(url: str) -> Tuple[str, str, int]:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        return scheme, (parts.hostname or "").lower(), parts.port or DEFAULT_PORTS.get(scheme, 0)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request over a pooled connection"""
+        now = time.monotonic()
+        if self.idle_timeout and now - self._last_reap >= self.idle_timeout:
+            self.reap_idle(now)
+
+        with self._lock:
+            self._last_used[self._host_key(url)] = now
+        self.stats.record_request()
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def reap_idle(self, now: Optional[float] = None) -> int:
+        """Close pools for hosts idle longer than idle_timeout; returns the number closed"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._last_reap = now
+            idle_hosts = {
+                host for host, last_used in self._last_used.items()
+                if now - last_used >= self.idle_timeout
+            }
+            for host in idle_hosts:
+                del self._last_used[host]
+
+        if not idle_hosts:
+            return 0
+
+        pools = self.adapter.poolmanager.pools
+        reaped = 0
+        for key in list(pools.keys()):
+            scheme = key.key_scheme
+            port = key.key_port or DEFAULT_PORTS.get(scheme, 0)
+            if (scheme, key.key_host, port) in idle_hosts:
+                try:
+                    del pools[key]  # the pool manager closes the pool's connections
+                    reaped += 1
+                except KeyError:
+                    pass
+        self.stats.record_reaped(reaped)
+        return reaped
+
+    def get_stats(self) -> Dict:
+        """Pool configuration plus hit/miss counters"""
+        stats = self.stats.snapshot()
+        stats.update({
+            "pool_connections": self.pool_connections,
+            "pool_maxsize": self.pool_maxsize,
+            "keep_alive": self.keep_alive,
+            "idle_timeout": self.idle_timeout,
+            "active_hosts": len(self._last_used)
+        })
+        return stats
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
@@ -0,0 +1,57 @@
+"""
+JSON encoding for chat payloads and responses: orjson when installed, the stdlib otherwise
+"""
+
+import json
+from collections.abc import Sequence
+from typing import Any, Union
+
+from config import JSON_BACKEND
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib module is used instead
+    orjson = None
+
+
+def _select_backend(name: str) -> str:
+    if name not in ("auto", "orjson", "stdlib"):
+        raise ValueError(f"Unknown JSON backend '{name}', expected auto, orjson or stdlib")
+    if name == "orjson" and orjson is None:
+        raise ValueError("JSON_BACKEND is 'orjson' but the orjson package is not installed")
+    if name == "auto":
+        return "orjson" if orjson is not None else "stdlib"
+    return name
+
+
+BACKEND = _select_backend(JSON_BACKEND)
+
+
+def _default(obj: Any) -> Any:
+    # Sequences other than list/tuple (e.g. history.History) are encoded as arrays
+    if isinstance(obj, Sequence) and not isinstance(obj, (str, bytes, bytearray)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(obj: Any, sort_keys: bool) -> bytes:
+    return json.dumps(obj, sort_keys=sort_keys, separators=(",", ":"), ensure_ascii=False,
+                      default=_default).encode("utf-8")
+
+
+def dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    """Compact UTF-8 JSON; both backends produce the same bytes for ordinary chat data"""
+    if BACKEND == "orjson":
+        try:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+        except TypeError:
+            # orjson is stricter (e.g. non-string keys, integers over 64 bits); let the stdlib try
+            pass
+    return _stdlib_dumps(obj, sort_keys)
+
+
+def loads(data: Union[bytes, bytearray, str]) -> Any:
+    """Parse JSON from bytes or str; raises ValueError (json.JSONDecodeError) on bad input"""
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
@@ -1,13 +1,44 @@
 import requests
-import msal
-import json
 import time
-from typing import Dict, List, Optional
-from config import CLIENT_ID, CLIENT_SECRET, APIM_SUBSCRIPTION_KEY, BASE_URL, AUTH_URI, TENANT_ID, SCOPE
+from typing import Dict, Iterator, Optional, Sequence
+from config import (CLIENT_ID, CLIENT_SECRET, APIM_SUBSCRIPTION_KEY, BASE_URL, AUTH_URI, TENANT_ID, SCOPE, RESPONSE_CACHE_ENABLED,
+                    UPSTREAM_COMPRESSION, COALESCE_ENABLED)
+from http_pool import PooledSession, is_connect_error
+from token_provider import get_token_provider
+from retry_policy import RetryPolicy
+from rate_limiter import RateLimiter, RateLimitTimeout, estimate_request_tokens
+from response_cache import ResponseCache, canonical_payload_key
+from coalescing import RequestCoalescer
+from history import HistoryManager, MessagesView, estimate_message_tokens
+from models_cache import ModelsCatalog
+from compression import Compressor
+import json_codec
+from metrics import (TOKEN_ACQUIRE_SECONDS, UPSTREAM_TTFB_SECONDS, UPSTREAM_SECONDS, JSON_SECONDS, UPSTREAM_ERRORS,
+                     UPSTREAM_IN_FLIGHT, record_usage)
+
+# Methods that may be sent twice, so they are retried after any connection error
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Sampling parameters sent with every chat request unless the caller overrides them
+DEFAULT_CHAT_PARAMS = {
+    "max_tokens": 1000,
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "frequency_penalty": 0,
+    "presence_penalty": 0
+}
+
+
+def extract_content(response_data: Dict) -> str:
+    """The assistant's reply text from a chat completion response"""
+    return response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
 
 
 class LlamaClient:
-    def __init__(self):
+    def __init__(self, session: Optional[PooledSession] = None, retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None, response_cache: Optional[ResponseCache] = None,
+                 history_manager: Optional[HistoryManager] = None,
+                 coalescer: Optional[RequestCoalescer] = None):
         self.base_url = BASE_URL
         self.client_id = CLIENT_ID
         self.client_secret = CLIENT_SECRET
@@ -17,34 +48,29 @@ class LlamaClient:
         self.scope = SCOPE
         self.access_token = None
         self.token_expires_at = 0
+        self.token_provider = get_token_provider(
+            self.client_id, self.client_secret, f"{self.auth_uri}/{self.tenant_id}", self.scope
+        )
+        # Keep-alive connection pool shared by every call this client makes
+        self.http = session or PooledSession()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        # Opt-in exact-match cache for deterministic (temperature 0) requests
+        self.response_cache = response_cache or (ResponseCache() if RESPONSE_CACHE_ENABLED else None)
+        self.history_manager = history_manager or HistoryManager()
+        # Identical deterministic requests in flight at the same time share one upstream call
+        self.coalescer = coalescer or (RequestCoalescer() if COALESCE_ENABLED else None)
+        self.models_catalog = ModelsCatalog(self._fetch_models)
+        # Large chat payloads are compressed only if the gateway is configured to accept it
+        self.upstream_compression = UPSTREAM_COMPRESSION or None
+        self.compressor = Compressor()
         
     def get_access_token(self) -> str:
         """Get access token using client credentials flow"""
         try:
-            # Create MSAL application
-            app = msal.ConfidentialClientApplication(
-                client_id=self.client_id,
-                client_credential=self.client_secret,
-                authority=f"{self.auth_uri}/{self.tenant_id}"
-            )
-            
-            # Get token - handle different scope options
-            if not self.scope:
-                # Try without scope first
-                result = app.acquire_token_for_client(scopes=[])
-            elif self.scope == [".default"]:
-                # Try with just .default scope
-                result = app.acquire_token_for_client(scopes=[".default"])
-            else:
-                result = app.acquire_token_for_client(scopes=self.scope)
-            
-            if "access_token" in result:
-                self.access_token = result["access_token"]
-                # Set expiration time (subtract 5 minutes for safety)
-                self.token_expires_at = time.time() + result.get("expires_in", 3600) - 300
-                return self.access_token
-            else:
-                raise Exception(f"Failed to get access token: {result.get('error_description', 'Unknown error')}")
+            # The shared provider reuses the MSAL app and its token cache
+            self.access_token, self.token_expires_at = self.token_provider.get_token()
+            return self.access_token
                 
         except Exception as e:
             raise Exception(f"Authentication failed: {str(e)}")
@@ -55,24 +81,92 @@ class LlamaClient:
     
     def ensure_valid_token(self):
         """Ensure we have a valid access token"""
+        started = time.perf_counter()
         if not self.is_token_valid():
             self.get_access_token()
+        TOKEN_ACQUIRE_SECONDS.observe(time.perf_counter() - started)
+    
+    def _headers(self, accept: Optional[str] = None) -> Dict:
+        """Request headers carrying the current access token and APIM key"""
+        headers = {
+            "Authorization": f"Bearer {self.access_token}",
+            "Ocp-Apim-Subscription-Key": self.subscription_key,
+            "Content-Type": "application/json"
+        }
+        if accept:
+            headers["Accept"] = accept
+        return headers
+    
+    def _send(self, method: str, url: str, operation: str, **kwargs) -> requests.Response:
+        """One HTTP attempt, timed for the upstream latency metrics"""
+        UPSTREAM_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            UPSTREAM_ERRORS.labels(operation, "network").inc()
+            raise
+        finally:
+            UPSTREAM_IN_FLIGHT.dec()
+        # elapsed stops when the response headers have been parsed
+        UPSTREAM_TTFB_SECONDS.labels(operation).observe(response.elapsed.total_seconds())
+        if not kwargs.get("stream"):
+            UPSTREAM_SECONDS.labels(operation).observe(time.perf_counter() - started)
+        if response.status_code >= 400:
+            UPSTREAM_ERRORS.labels(operation, response.status_code).inc()
+        return response
+    
+    def _request(self, method: str, url: str, tokens: int = 0, operation: str = "other",
+                 **kwargs) -> requests.Response:
+        """Send a request, retrying throttled/unavailable responses and connection failures.
+
+        A POST is only retried after a connection error if the connection was
+        never established, and only for 429/503 responses: once it has been
+        sent (e.g. the server disconnected, or APIM answered 502/504) the model
+        may already have generated, and a retry could run the completion twice. Every attempt first takes a slot from
+        the rate limiter; ``tokens`` (the estimated model tokens) is charged
+        once, on the first attempt. ``operation`` labels the request in the
+        upstream metrics.
+        """
+        policy = self.retry_policy
+        deadline_at = time.monotonic() + policy.deadline
+        timeout = kwargs.get("timeout")
+        attempt = 0
+        while True:
+            if isinstance(timeout, (int, float)):
+                # Later attempts only get whatever is left of the deadline
+                kwargs["timeout"] = max(min(timeout, deadline_at - time.monotonic()), 0.1)
+            self.rate_limiter.acquire(tokens if attempt == 0 else 0)
+            try:
+                response = self._send(method, url, operation, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                if method not in IDEMPOTENT_METHODS and not is_connect_error(e):
+                    raise
+                delay = policy.next_delay(attempt, deadline_at)
+                if delay is None:
+                    raise
+            else:
+                if not policy.should_retry_status(response.status_code, method in IDEMPOTENT_METHODS):
+                    return response
+                delay = policy.next_delay(attempt, deadline_at, response.headers.get("Retry-After"))
+                if delay is None:
+                    return response
+                response.close()
+            
+            time.sleep(delay)
+            attempt += 1
     
     def test_connection(self) -> Dict:
         """Test the connection to the LLAMA LLM service"""
         try:
             self.ensure_valid_token()
             
-            headers = {
-                "Authorization": f"Bearer {self.access_token}",
-                "Ocp-Apim-Subscription-Key": self.subscription_key,
-                "Content-Type": "application/json"
-            }
+            headers = self._headers()
             
             # Test endpoint - using the correct API path
             test_url = f"{self.base_url}/v1/health"  # or /status, /ping, etc.
             
-            response = requests.get(test_url, headers=headers, timeout=30)
+            response = self._request("GET", test_url, operation="health", headers=headers, timeout=30)
             
             if response.status_code == 200:
                 return {
@@ -87,6 +181,11 @@ class LlamaClient:
                     "response": response.text
                 }
                 
+        except RateLimitTimeout as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
         except requests.exceptions.RequestException as e:
             return {
                 "status": "error",
@@ -98,44 +197,110 @@ class LlamaClient:
                 "message": f"Unexpected error: {str(e)}"
             }
     
-    def send_chat_message(self, message: str, conversation_history: Optional[List[Dict]] = None) -> Dict:
-        """Send a chat message to the LLAMA LLM"""
+    def _encode_payload(self, payload: Dict, headers: Dict) -> bytes:
+        """Serialize a JSON payload, compressing it when upstream compression is enabled"""
+        started = time.perf_counter()
+        body = json_codec.dumps(payload)
+        JSON_SECONDS.labels("encode").observe(time.perf_counter() - started)
+        if self.upstream_compression:
+            compressed = self.compressor.compress(body, self.upstream_compression)
+            if compressed is not None:
+                headers["Content-Encoding"] = self.upstream_compression
+                return compressed
+        return body
+    
+    def _fit_history(self, message: str, conversation_history: Optional[Sequence[Dict]],
+                     params: Dict) -> Sequence[Dict]:
+        """Trim history so it, the new message and the completion fit the context budget"""
+        reserve = estimate_message_tokens({"content": message}) + int(params.get("max_tokens") or 0)
+        return self.history_manager.fit(conversation_history or [], reserve)
+    
+    def _build_payload(self, message: str, conversation_history: Optional[Sequence[Dict]], sampling: Dict,
+                       stream: bool = False) -> Dict:
+        """Chat payload: history trimmed to the context budget, the new message and sampling parameters"""
+        params = {**DEFAULT_CHAT_PARAMS, **sampling}
+        # A view over the (possibly trimmed) history plus the new message: nothing is
+        # copied, and the caller's list or History storage is never appended to
+        messages = MessagesView(self._fit_history(message, conversation_history, params), {
+            "role": "user",
+            "content": message
+        })
+        payload = {
+            "messages": messages,
+            **params
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+    
+    def _payload_key(self, payload: Dict) -> Optional[str]:
+        """canonical_payload_key, computed only if the response cache or coalescer will use it"""
+        if ((self.response_cache and self.response_cache.is_cacheable(payload))
+                or (self.coalescer and self.coalescer.applies(payload))):
+            return canonical_payload_key(payload)
+        return None
+    
+    def send_chat_message(self, message: str, conversation_history: Optional[Sequence[Dict]] = None,
+                          **sampling) -> Dict:
+        """Send a chat message to the LLAMA LLM.
+
+        ``conversation_history`` (a list or a history.History) is not modified
+        or copied, so it must not be changed while the call is in progress.
+        Keyword arguments (``temperature``, ``max_tokens``, ``top_p``, ...)
+        override the default sampling parameters.
+        """
         try:
-            self.ensure_valid_token()
+            payload = self._build_payload(message, conversation_history, sampling)
             
-            headers = {
-                "Authorization": f"Bearer {self.access_token}",
-                "Ocp-Apim-Subscription-Key": self.subscription_key,
-                "Content-Type": "application/json"
-            }
+            # Encoded and hashed once, then shared by the cache lookup, coalescing and cache store
+            key = self._payload_key(payload)
+            if self.response_cache:
+                cached = self.response_cache.get(payload, key)
+                if cached is not None:
+                    return {
+                        "status": "success",
+                        "response": cached,
+                        "message": extract_content(cached),
+                        "cached": True
+                    }
             
-            # Prepare the request payload
-            payload = {
-                "messages": conversation_history or [],
-                "max_tokens": 1000,
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "frequency_penalty": 0,
-                "presence_penalty": 0
+            if self.coalescer and self.coalescer.applies(payload):
+                return self.coalescer.call(key, lambda: self._complete_chat(payload, key))
+            return self._complete_chat(payload, key)
+        
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Unexpected error: {str(e)}"
             }
+    
+    def _complete_chat(self, payload: Dict, key: Optional[str] = None) -> Dict:
+        """Send a prepared chat payload upstream and cache a successful result"""
+        try:
+            self.ensure_valid_token()
             
-            # Add the new message
-            payload["messages"].append({
-                "role": "user",
-                "content": message
-            })
+            headers = self._headers()
             
             # Send request to chat endpoint
             chat_url = f"{self.base_url}/v1/chat/completions"  # Correct endpoint
             
-            response = requests.post(chat_url, headers=headers, json=payload, timeout=60)
+            estimated_tokens = estimate_request_tokens(payload)
+            body = self._encode_payload(payload, headers)
+            response = self._request("POST", chat_url, tokens=estimated_tokens, operation="chat", headers=headers,
+                                     data=body, timeout=60)
             
             if response.status_code == 200:
-                response_data = response.json()
+                started = time.perf_counter()
+                response_data = json_codec.loads(response.content)
+                JSON_SECONDS.labels("decode").observe(time.perf_counter() - started)
+                record_usage(response_data.get("usage"))
+                self.rate_limiter.reconcile(estimated_tokens, (response_data.get("usage") or {}).get("total_tokens"))
+                if self.response_cache:
+                    self.response_cache.set(payload, response_data, key)
                 return {
                     "status": "success",
                     "response": response_data,
-                    "message": response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
+                    "message": extract_content(response_data)
                 }
             else:
                 return {
@@ -144,6 +309,11 @@ class LlamaClient:
                     "response": response.text
                 }
                 
+        except RateLimitTimeout as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
         except requests.exceptions.RequestException as e:
             return {
                 "status": "error",
@@ -155,25 +325,171 @@ class LlamaClient:
                 "message": f"Unexpected error: {str(e)}"
             }
     
-    def get_available_models(self) -> Dict:
-        """Get list of available models"""
+    def stream_chat_message(self, message: str, conversation_history: Optional[Sequence[Dict]] = None,
+                            **sampling) -> Iterator[Dict]:
+        """Stream a chat completion from the LLAMA LLM.
+
+        Yields ``{"status": "delta", "content": ...}`` for each token delta as it
+        arrives, then a final ``{"status": "success", "message": <full text>}``
+        or ``{"status": "error", "message": ...}``. Keyword arguments override
+        the default sampling parameters as in send_chat_message.
+        """
+        try:
+            payload = self._build_payload(message, conversation_history, sampling, stream=True)
+            
+            key = self._payload_key(payload)
+            if self.response_cache:
+                cached = self.response_cache.get(payload, key)
+                if cached is not None:
+                    # Replay a cached completion as a single delta
+                    content = extract_content(cached)
+                    if content:
+                        yield {"status": "delta", "content": content}
+                    yield {"status": "success", "message": content, "usage": cached.get("usage"), "cached": True}
+                    return
+            
+            if self.coalescer and self.coalescer.applies(payload):
+                events = self.coalescer.stream(key, lambda: self._stream_chat(payload, key))
+            else:
+                events = self._stream_chat(payload, key)
+        
+        except Exception as e:
+            yield {
+                "status": "error",
+                "message": f"Unexpected error: {str(e)}"
+            }
+            return
+        
+        yield from events
+    
+    def _stream_chat(self, payload: Dict, key: Optional[str] = None) -> Iterator[Dict]:
+        """Stream a prepared chat payload from upstream and cache the completed reply"""
+        response = None
         try:
             self.ensure_valid_token()
             
-            headers = {
-                "Authorization": f"Bearer {self.access_token}",
-                "Ocp-Apim-Subscription-Key": self.subscription_key,
-                "Content-Type": "application/json"
+            headers = self._headers(accept="text/event-stream")
+            
+            chat_url = f"{self.base_url}/v1/chat/completions"
+            
+            # Read timeout applies between chunks, not to the whole generation
+            estimated_tokens = estimate_request_tokens(payload)
+            body = self._encode_payload(payload, headers)
+            started = time.perf_counter()
+            response = self._request("POST", chat_url, tokens=estimated_tokens, operation="chat_stream",
+                                     headers=headers, data=body, timeout=(10, 60), stream=True)
+            
+            if response.status_code != 200:
+                yield {
+                    "status": "error",
+                    "message": f"Chat request failed with status {response.status_code}",
+                    "response": response.text
+                }
+                return
+            
+            parts = []
+            usage = None
+            finish_reason = None
+            done = False
+            completion = {}
+            decode_seconds = 0.0
+            # chunk_size=None yields each chunk as it arrives instead of waiting for 512 bytes.
+            # Lines stay bytes: the JSON decoder reads UTF-8 directly, whereas requests would
+            # decode text/event-stream without a charset as ISO-8859-1
+            for line in response.iter_lines(chunk_size=None):
+                # SSE frames look like "data: {...}"; skip keep-alives and other fields
+                if done or not line or not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    # Read on to EOF instead of breaking: abandoning the line generator makes
+                    # urllib3 close the socket rather than return the connection to the pool
+                    done = True
+                    continue
+                
+                decode_started = time.perf_counter()
+                chunk = json_codec.loads(data)
+                decode_seconds += time.perf_counter() - decode_started
+                usage = chunk.get("usage") or usage
+                if not completion:
+                    completion = {field: chunk[field] for field in ("id", "created", "model") if field in chunk}
+                choices = chunk.get("choices") or [{}]
+                finish_reason = choices[0].get("finish_reason") or finish_reason
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    parts.append(content)
+                    yield {"status": "delta", "content": content}
+            
+            if not done and not finish_reason:
+                # The connection closed mid-reply; the text so far is not a complete answer
+                yield {
+                    "status": "error",
+                    "message": "Stream ended before the reply was complete"
+                }
+                return
+            
+            UPSTREAM_SECONDS.labels("chat_stream").observe(time.perf_counter() - started)
+            JSON_SECONDS.labels("decode").observe(decode_seconds)
+            record_usage(usage)
+            if usage:
+                self.rate_limiter.reconcile(estimated_tokens, usage.get("total_tokens"))
+            # Only a stream closed with [DONE] is known to be whole; the entry is stored as a full
+            # chat.completion because non-streaming requests for the same payload share the key
+            if self.response_cache and done:
+                self.response_cache.set(payload, {
+                    **completion,
+                    "object": "chat.completion",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(parts)},
+                        "finish_reason": finish_reason
+                    }],
+                    "usage": usage
+                }, key)
+            yield {
+                "status": "success",
+                "message": "".join(parts),
+                "usage": usage
             }
+                
+        except RateLimitTimeout as e:
+            yield {
+                "status": "error",
+                "message": str(e)
+            }
+        except requests.exceptions.RequestException as e:
+            yield {
+                "status": "error",
+                "message": f"Network error: {str(e)}"
+            }
+        except Exception as e:
+            yield {
+                "status": "error",
+                "message": f"Unexpected error: {str(e)}"
+            }
+        finally:
+            if response is not None:
+                response.close()
+    
+    def get_available_models(self, force_refresh: bool = False) -> Dict:
+        """Get list of available models (cached; see ModelsCatalog)"""
+        return self.models_catalog.get(force_refresh)
+    
+    def _fetch_models(self) -> Dict:
+        """Fetch the models catalog from the service"""
+        try:
+            self.ensure_valid_token()
+            
+            headers = self._headers()
             
             models_url = f"{self.base_url}/v1/models"
             
-            response = requests.get(models_url, headers=headers, timeout=30)
+            response = self._request("GET", models_url, operation="models", headers=headers, timeout=30)
             
             if response.status_code == 200:
                 return {
                     "status": "success",
-                    "models": response.json()
+                    "models": json_codec.loads(response.content)
                 }
             else:
                 return {
@@ -186,4 +502,40 @@ class LlamaClient:
             return {
                 "status": "error",
                 "message": f"Error getting models: {str(e)}"
-            } 
\ No newline at end of file
+            }
+    
+    def get_token_metrics(self) -> Dict:
+        """Get token refresh latency and failure metrics"""
+        return self.token_provider.get_metrics()
+    
+    def get_retry_stats(self) -> Dict:
+        """Get retry and give-up counters"""
+        return self.retry_policy.get_stats()
+    
+    def get_rate_limit_stats(self) -> Dict:
+        """Get client-side rate limiter counters"""
+        return self.rate_limiter.get_stats()
+    
+    def get_cache_stats(self) -> Optional[Dict]:
+        """Get response cache hit rate, or None if the cache is disabled"""
+        return self.response_cache.get_stats() if self.response_cache else None
+    
+    def get_coalescing_stats(self) -> Optional[Dict]:
+        """Get request coalescing counters, or None if coalescing is disabled"""
+        return self.coalescer.get_stats() if self.coalescer else None
+    
+    def get_models_cache_stats(self) -> Dict:
+        """Get models catalog cache hit and refresh counters"""
+        return self.models_catalog.get_stats()
+    
+    def get_compression_stats(self) -> Dict:
+        """Get upstream payload compression counters (bytes saved vs CPU time)"""
+        return self.compressor.get_stats()
+    
+    def get_pool_stats(self) -> Dict:
+        """Get connection pool hit/miss counters"""
+        return self.http.get_stats()
+    
+    def close(self):
+        """Close pooled connections"""
+        self.http.close()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Load generator for the chat backend
+
+Sends /api/chat (or /api/chat/stream) requests at a fixed arrival rate with a
+cap on requests in flight, then reports latency percentiles, throughput and
+error rates as JSON. Latency is measured from when each request was scheduled
+to start, so time spent queued behind the concurrency cap counts against the
+server instead of being hidden. Pass --compare with an earlier report to flag
+regressions.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import aiohttp
+import requests
+
+# Relative change beyond which --compare calls a metric a regression
+DEFAULT_THRESHOLD = 0.10
+# Absolute rise in error rate (percentage points / 100) that counts as a regression
+ERROR_RATE_TOLERANCE = 0.01
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q / 100.0 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize_latencies(values: List[float]) -> Dict:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None
+    }
+
+
+class LoadTest:
+    """Open-loop load: request i is due at ``i / rps`` seconds regardless of earlier responses"""
+
+    def __init__(self, url: str, rps: float, concurrency: int, duration: float, stream: bool = False,
+                 same_message: bool = False, timeout: float = 120.0):
+        self.url = url.rstrip('/')
+        self.rps = rps
+        self.concurrency = concurrency
+        self.duration = duration
+        self.stream = stream
+        self.same_message = same_message
+        self.timeout = timeout
+        self.results: List[Dict] = []
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.url}/api/chat/stream" if self.stream else f"{self.url}/api/chat"
+
+    def make_body(self, index: int) -> Dict:
+        # Distinct messages keep the response cache and coalescer out of the measurement
+        message = "Load test message" if self.same_message else f"Load test message {index}"
+        return {"message": message, "conversation_history": []}
+
+    async def read_stream(self, response, result: Dict, scheduled: float):
+        """Consume the SSE reply, noting when the first token arrived.
+
+        Only a stream that ends with a success frame (or [DONE]) counts as a
+        success; an unparsable frame or an early end is recorded as an error.
+        """
+        async for raw in response.content:
+            line = raw.decode("utf-8", errors="replace").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            try:
+                event = json.loads(data)
+            except ValueError:
+                # e.g. a proxy's error page spliced into the stream
+                result["error"] = "stream_invalid_json"
+                return
+            if event.get("status") == "delta" and "ttft" not in result:
+                result["ttft"] = time.monotonic() - scheduled
+            elif event.get("status") == "error":
+                result["error"] = "stream_error"
+                return
+            elif event.get("status") == "success":
+                return
+        result["error"] = "stream_incomplete"
+
+    async def one_request(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                          index: int, scheduled: float):
+        async with semaphore:
+            sent = time.monotonic()
+            result = {"error": None}
+            try:
+                async with session.post(self.endpoint, json=self.make_body(index)) as response:
+                    result["status_code"] = response.status
+                    if response.status != 200:
+                        await response.read()
+                        result["error"] = f"http_{response.status}"
+                    elif self.stream:
+                        await self.read_stream(response, result, scheduled)
+                    else:
+                        data = await response.json()
+                        if data.get("status") != "success":
+                            result["error"] = "app_error"
+            except asyncio.TimeoutError:
+                result["error"] = "timeout"
+            except aiohttp.ClientError as e:
+                result["error"] = f"connection_{type(e).__name__}"
+            finished = time.monotonic()
+            result["latency"] = finished - scheduled
+            result["service_time"] = finished - sent
+            self.results.append(result)
+
+    async def run(self) -> Dict:
+        total = max(int(self.rps * self.duration), 1)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        started_at = datetime.now(timezone.utc).isoformat()
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            start = time.monotonic()
+            tasks = []
+            for index in range(total):
+                scheduled = start + index / self.rps
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self.one_request(session, semaphore, index, scheduled)))
+            await asyncio.gather(*tasks)
+            elapsed = time.monotonic() - start
+        return self.report(started_at, elapsed)
+
+    def report(self, started_at: str, elapsed: float) -> Dict:
+        ok = [r for r in self.results if not r["error"]]
+        errors: Dict[str, int] = {}
+        for result in self.results:
+            if result["error"]:
+                errors[result["error"]] = errors.get(result["error"], 0) + 1
+        report = {
+            "started_at": started_at,
+            "host": platform.node(),
+            "config": {
+                "url": self.endpoint,
+                "rps": self.rps,
+                "concurrency": self.concurrency,
+                "duration": self.duration,
+                "stream": self.stream,
+                "same_message": self.same_message
+            },
+            "elapsed": elapsed,
+            "requests": len(self.results),
+            "succeeded": len(ok),
+            "errors": errors,
+            "error_rate": (len(self.results) - len(ok)) / len(self.results) if self.results else 0.0,
+            "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+            "latency": summarize_latencies([r["latency"] for r in ok]),
+            "service_time": summarize_latencies([r["service_time"] for r in ok])
+        }
+        if self.stream:
+            report["ttft"] = summarize_latencies([r["ttft"] for r in ok if "ttft" in r])
+        return report
+
+
+def compare_reports(baseline: Dict, current: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """Describe every metric that got worse than the baseline by more than ``threshold``"""
+    regressions = []
+    for section in ("latency", "ttft"):
+        for key in ("p50", "p95", "p99"):
+            before = (baseline.get(section) or {}).get(key)
+            after = (current.get(section) or {}).get(key)
+            if before and after and after > before * (1 + threshold):
+                regressions.append(f"{section} {key}: {before * 1000:.1f}ms -> {after * 1000:.1f}ms "
+                                   f"(+{(after / before - 1):.0%})")
+    before, after = baseline.get("throughput_rps"), current.get("throughput_rps")
+    if before and after is not None and after < before * (1 - threshold):
+        regressions.append(f"throughput: {before:.1f} -> {after:.1f} req/s ({(after / before - 1):.0%})")
+    before, after = baseline.get("error_rate", 0.0), current.get("error_rate", 0.0)
+    if after > before + ERROR_RATE_TOLERANCE:
+        regressions.append(f"error rate: {before:.2%} -> {after:.2%}")
+    return regressions
+
+
+def fetch_gateway_stats(gateway_url: str) -> Optional[Dict]:
+    """Upstream call counts from a mock gateway, to see what reached it"""
+    try:
+        return requests.get(f"{gateway_url.rstrip('/')}/mock/stats", timeout=5).json()
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+
+def print_summary(report: Dict):
+    def ms(value):
+        return f"{value * 1000:.1f}ms" if value is not None else "n/a"
+
+    print("=" * 50)
+    print("📋 RESULTS")
+    print("=" * 50)
+    print(f"Requests:   {report['requests']} in {report['elapsed']:.1f}s "
+          f"({report['succeeded']} ok, error rate {report['error_rate']:.2%})")
+    print(f"Throughput: {report['throughput_rps']:.1f} req/s")
+    for name in ("latency", "service_time", "ttft"):
+        stats = report.get(name)
+        if stats:
+            print(f"{name + ':':<12}p50 {ms(stats['p50'])}  p95 {ms(stats['p95'])}  p99 {ms(stats['p99'])}  "
+                  f"max {ms(stats['max'])}")
+    for error, count in sorted(report["errors"].items()):
+        print(f"   ❌ {error}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive /api/chat at a target rate and report latency percentiles")
+    parser.add_argument("--url", default="http://localhost:5000", help="Base URL of app.py or async_app.py")
+    parser.add_argument("--rps", type=float, default=20.0, help="Requests started per second")
+    parser.add_argument("--concurrency", type=int, default=50, help="Maximum requests in flight")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to keep starting requests")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds before a request counts as timed out")
+    parser.add_argument("--stream", action="store_true", help="Use /api/chat/stream and report time to first token")
+    parser.add_argument("--same-message", action="store_true",
+                        help="Send one message repeatedly (exercises caching and coalescing)")
+    parser.add_argument("--gateway-url", help="Mock gateway URL; its request counts are added to the report")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Earlier JSON report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative change that counts as a regression")
+    args = parser.parse_args()
+
+    print(f"🚀 {args.rps:g} req/s for {args.duration:g}s, up to {args.concurrency} in flight")
+    load_test = LoadTest(args.url, args.rps, args.concurrency, args.duration, stream=args.stream,
+                         same_message=args.same_message, timeout=args.timeout)
+    report = asyncio.run(load_test.run())
+    if args.gateway_url:
+        report["gateway"] = fetch_gateway_stats(args.gateway_url)
+
+    print_summary(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print(f"⚠️  {args.compare} was run with different settings; comparing anyway")
+        regressions = compare_reports(baseline, report, args.threshold)
+        if regressions:
+            print(f"⚠️  Regressions against {args.compare}:")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print(f"✅ No regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Prometheus-style counters, gauges and histograms with text exposition
+"""
+
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets in seconds, from sub-millisecond JSON work to multi-minute generations
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values):
+        """Child metric for one combination of label values (created once, then looked up)"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        return self.labels()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def _render_child(self, key, child):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_value(float(bound)) if bound != float("inf") else "+Inf"}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds metrics plus collectors that report gauge values computed at scrape time"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]):
+        """``collector()`` yields (name, help, labels, value) gauge samples when metrics are rendered"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+
+        samples: Dict[str, Tuple[str, List[Tuple[Dict[str, str], float]]]] = {}
+        for collector in self._collectors:
+            try:
+                for name, documentation, labels, value in collector():
+                    samples.setdefault(name, (documentation, []))[1].append((labels, value))
+            except Exception:
+                # A failing collector must not take the whole endpoint down
+                continue
+        for name, (documentation, values) in samples.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in values:
+                label_text = _format_labels(tuple(labels), tuple(labels.values()))
+                lines.append(f"{name}{label_text} {_format_value(value if value is not None else 0)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Backend (Flask / aiohttp) request metrics
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "llama_http_request_duration_seconds", "Time to handle a backend API request", ["endpoint"]))
+HTTP_RESPONSES = REGISTRY.register(Counter(
+    "llama_http_responses_total", "Backend API responses by status code", ["endpoint", "status"]))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "llama_http_requests_in_flight", "Backend API requests currently being handled"))
+
+# Upstream (LlamaClient) metrics, split by phase
+TOKEN_ACQUIRE_SECONDS = REGISTRY.register(Histogram(
+    "llama_token_acquire_seconds", "Time spent getting a valid access token before a request"))
+UPSTREAM_CONNECT_SECONDS = REGISTRY.register(Histogram(
+    "llama_upstream_connect_seconds", "Time to open a new connection (TCP and TLS) to the gateway"))
+UPSTREAM_TTFB_SECONDS = REGISTRY.register(Histogram(
+    "llama_upstream_ttfb_seconds", "Time from sending a request to the first response byte", ["operation"]))
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    "llama_upstream_duration_seconds", "Time from sending a request to the last response byte (generation)",
+    ["operation"]))
+JSON_SECONDS = REGISTRY.register(Histogram(
+    "llama_json_seconds", "Time spent encoding request and decoding response JSON", ["direction"]))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "llama_upstream_errors_total", "Failed upstream requests by HTTP status (or 'network')", ["operation", "status"]))
+UPSTREAM_IN_FLIGHT = REGISTRY.register(Gauge(
+    "llama_upstream_requests_in_flight", "Requests to the gateway currently in flight"))
+COMPLETION_TOKENS = REGISTRY.register(Counter(
+    "llama_completion_tokens_total", "Tokens reported in completion usage", ["kind"]))
+
+
+# Export the in-flight gauges as 0 before the first request
+HTTP_IN_FLIGHT.set(0)
+UPSTREAM_IN_FLIGHT.set(0)
+
+
+def record_usage(usage: Optional[Dict]):
+    """Count prompt/completion/total tokens from a completion's usage field"""
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = usage.get(kind)
+        if value:
+            COMPLETION_TOKENS.labels(kind[:-len("_tokens")]).inc(value)
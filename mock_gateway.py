@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Flamingo LLM gateway and its token endpoint
+
+Implements /v1/health, /v1/models and /v1/chat/completions (JSON and SSE
+streaming) plus an OAuth2 client-credentials token endpoint, with configurable
+latency, token rate and fault injection, so app.py and LlamaClient can be
+benchmarked without touching the real service. Point the app at it with:
+
+    BASE_URL=http://127.0.0.1:8001 TOKEN_ENDPOINT=http://127.0.0.1:8001/mock/oauth2/v2.0/token
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from typing import Dict
+
+from aiohttp import web
+
+from compression import Compressor, DecompressionError
+from rate_limiter import estimate_request_tokens
+from config import MOCK_GATEWAY_HOST, MOCK_GATEWAY_PORT
+
+MODELS = {
+    "object": "list",
+    "data": [
+        {"id": "llama-mock-large", "object": "model", "owned_by": "mock"},
+        {"id": "llama-mock-small", "object": "model", "owned_by": "mock"}
+    ]
+}
+
+FILLER = ("the quick brown fox jumps over a lazy dog while the gateway "
+          "streams one token at a time to measure the client").split()
+
+
+class GatewayStats:
+    """Counts of requests served and faults injected, by endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.faults: Dict[str, int] = {}
+        self.completion_tokens = 0
+
+    def record(self, endpoint: str, fault: str = None, tokens: int = 0):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            if fault:
+                self.faults[fault] = self.faults.get(fault, 0) + 1
+            self.completion_tokens += tokens
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "faults": dict(self.faults),
+                "completion_tokens": self.completion_tokens
+            }
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.faults.clear()
+            self.completion_tokens = 0
+
+
+class MockGateway:
+    """Behaviour knobs for the mock; every chat request draws its own latency and fault.
+
+    ``latency`` (+ up to ``jitter``) seconds pass before the first byte,
+    completions are ``completion_tokens`` long (capped by ``max_tokens``) and
+    are produced at ``token_rate`` tokens per second (0 = instantly). The
+    ``*_rate`` arguments are the probabilities of answering 429, 503 or
+    hanging for ``hang_seconds`` so the client's timeout fires.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, token_rate: float = 0.0,
+                 completion_tokens: int = 50, rate_429: float = 0.0, rate_503: float = 0.0,
+                 timeout_rate: float = 0.0, hang_seconds: float = 120.0, retry_after: float = 1.0,
+                 token_lifetime: int = 3600, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_rate = token_rate
+        self.completion_tokens = completion_tokens
+        self.rate_429 = rate_429
+        self.rate_503 = rate_503
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.retry_after = retry_after
+        self.token_lifetime = token_lifetime
+        self.random = random.Random(seed)
+        self.compressor = Compressor()
+        self.stats = GatewayStats()
+
+    def draw_fault(self):
+        """None, or which fault to inject for this request"""
+        roll = self.random.random()
+        for fault, rate in (("http_429", self.rate_429), ("http_503", self.rate_503), ("timeout", self.timeout_rate)):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    def draw_latency(self) -> float:
+        return self.latency + self.random.uniform(0, self.jitter) if self.jitter else self.latency
+
+    def completion_words(self, payload: Dict):
+        count = self.completion_tokens
+        if payload.get("max_tokens"):
+            count = min(count, int(payload["max_tokens"]))
+        return [FILLER[i % len(FILLER)] for i in range(max(count, 1))]
+
+
+def get_gateway(request) -> MockGateway:
+    return request.app['gateway']
+
+
+routes = web.RouteTableDef()
+
+
+def unauthorized():
+    return web.json_response({"error": {"code": "401", "message": "Missing bearer token"}}, status=401)
+
+
+def has_bearer(request) -> bool:
+    return request.headers.get('Authorization', '').startswith('Bearer ')
+
+
+@routes.get('/v1/health')
+async def health(request):
+    get_gateway(request).stats.record('health')
+    return web.json_response({"status": "healthy"})
+
+
+@routes.get('/v1/models')
+async def models(request):
+    if not has_bearer(request):
+        return unauthorized()
+    get_gateway(request).stats.record('models')
+    return web.json_response(MODELS)
+
+
+async def read_payload(request, gateway: MockGateway) -> Dict:
+    body = await request.read()
+    encoding = request.headers.get('Content-Encoding', '').strip().lower()
+    if encoding and encoding != 'identity':
+        body = gateway.compressor.decompress(body, encoding)
+    return json.loads(body)
+
+
+@routes.post('/v1/chat/completions')
+async def chat_completions(request):
+    gateway = get_gateway(request)
+    if not has_bearer(request):
+        return unauthorized()
+    try:
+        payload = await read_payload(request, gateway)
+    except (DecompressionError, ValueError) as e:
+        return web.json_response({"error": {"code": "400", "message": str(e)}}, status=400)
+
+    fault = gateway.draw_fault()
+    if fault == "http_429":
+        gateway.stats.record('chat', fault)
+        return web.json_response({"error": {"code": "429", "message": "Rate limit exceeded"}}, status=429,
+                                 headers={"Retry-After": f"{gateway.retry_after:g}"})
+    if fault == "http_503":
+        gateway.stats.record('chat', fault)
+        return web.json_response({"error": {"code": "503", "message": "Service unavailable"}}, status=503)
+    if fault == "timeout":
+        gateway.stats.record('chat', fault)
+        await asyncio.sleep(gateway.hang_seconds)
+        return web.json_response({"error": {"code": "504", "message": "Upstream timed out"}}, status=504)
+
+    await asyncio.sleep(gateway.draw_latency())
+    words = gateway.completion_words(payload)
+    usage = {
+        "prompt_tokens": estimate_request_tokens({"messages": payload.get("messages", [])}),
+        "completion_tokens": len(words)
+    }
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    model = payload.get("model") or MODELS["data"][0]["id"]
+    gateway.stats.record('chat_stream' if payload.get("stream") else 'chat', tokens=len(words))
+
+    if not payload.get("stream"):
+        if gateway.token_rate:
+            await asyncio.sleep(len(words) / gateway.token_rate)
+        return web.json_response({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        })
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    interval = 1.0 / gateway.token_rate if gateway.token_rate else 0.0
+    for i, word in enumerate(words):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": word if i == 0 else f" {word}"}, "finish_reason": None}]
+        }
+        await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        if interval:
+            await asyncio.sleep(interval)
+    final = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "model": model,
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        "usage": usage
+    }
+    await response.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+
+@routes.post('/{tenant}/oauth2/v2.0/token')
+async def token(request):
+    """OAuth2 client-credentials grant; any client ID and secret are accepted"""
+    gateway = get_gateway(request)
+    form = await request.post()
+    if form.get('grant_type') != 'client_credentials':
+        return web.json_response({"error": "unsupported_grant_type",
+                                  "error_description": "Only client_credentials is supported"}, status=400)
+    gateway.stats.record('token')
+    return web.json_response({
+        "token_type": "Bearer",
+        "expires_in": gateway.token_lifetime,
+        "access_token": f"mock-{uuid.uuid4().hex}"
+    })
+
+
+@routes.get('/mock/stats')
+async def stats(request):
+    return web.json_response(get_gateway(request).stats.snapshot())
+
+
+@routes.post('/mock/reset')
+async def reset(request):
+    get_gateway(request).stats.reset()
+    return web.json_response({"status": "success"})
+
+
+def create_app(gateway: MockGateway = None) -> web.Application:
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app['gateway'] = gateway or MockGateway()
+    app.add_routes(routes)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock of the Flamingo LLM gateway")
+    parser.add_argument("--host", default=MOCK_GATEWAY_HOST)
+    parser.add_argument("--port", type=int, default=MOCK_GATEWAY_PORT)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds before the first byte of a chat reply")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency, up to this many seconds")
+    parser.add_argument("--token-rate", type=float, default=0.0,
+                        help="Completion tokens generated per second (0 = instantly)")
+    parser.add_argument("--completion-tokens", type=int, default=50, help="Length of every completion")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Fraction of chats answered with 429")
+    parser.add_argument("--error-503", type=float, default=0.0, help="Fraction of chats answered with 503")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Fraction of chats that hang")
+    parser.add_argument("--hang-seconds", type=float, default=120.0, help="How long a hanging chat hangs")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with 429 responses")
+    parser.add_argument("--token-lifetime", type=int, default=3600, help="expires_in of issued tokens")
+    parser.add_argument("--seed", type=int, help="Seed for latency and fault draws")
+    args = parser.parse_args()
+
+    gateway = MockGateway(latency=args.latency, jitter=args.jitter, token_rate=args.token_rate,
+                          completion_tokens=args.completion_tokens, rate_429=args.error_429,
+                          rate_503=args.error_503, timeout_rate=args.timeout_rate,
+                          hang_seconds=args.hang_seconds, retry_after=args.retry_after,
+                          token_lifetime=args.token_lifetime, seed=args.seed)
+
+    base_url = f"http://{args.host}:{args.port}"
+    print("🧪 Starting mock Flamingo gateway...")
+    print(f"   Latency: {args.latency}s (+{args.jitter}s jitter), token rate: {args.token_rate or 'instant'}")
+    print(f"   Faults: 429={args.error_429:.1%} 503={args.error_503:.1%} timeout={args.timeout_rate:.1%}")
+    print("💡 Point the app at it with:")
+    print(f"   BASE_URL={base_url} TOKEN_ENDPOINT={base_url}/mock/oauth2/v2.0/token")
+    print("=" * 50)
+
+    web.run_app(create_app(gateway), host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Models catalog cache with stale-while-revalidate background refresh
+"""
+
+import hashlib
+import json
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from config import MODELS_CACHE_TTL, MODELS_CACHE_STALE_TTL
+
+
+def models_etag(models) -> str:
+    """Strong ETag derived from the catalog contents, so every worker computes the same one"""
+    encoded = json.dumps(models, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32]
+
+
+class ModelsCatalog:
+    """Caches the result of a models fetch.
+
+    A catalog younger than ``ttl`` is served as is. Between ``ttl`` and
+    ``ttl + stale_ttl`` the stale copy is served while one background thread
+    refetches it. Older than that (or never fetched), callers wait for a
+    fetch, which concurrent callers share. A failed refresh keeps the last
+    good catalog until it falls out of the stale window.
+    """
+
+    def __init__(self, fetch: Callable[[], Dict], ttl: float = MODELS_CACHE_TTL,
+                 stale_ttl: float = MODELS_CACHE_STALE_TTL):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._refreshing = False
+        # (models, etag, fetched_at) of the last successful fetch
+        self._entry = None
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.fetches = 0
+        self.background_refreshes = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def get(self, force_refresh: bool = False) -> Dict:
+        """Return ``{"status": "success", "models", "etag", "age", "max_age"}`` or an error result"""
+        entry = self._entry
+        if entry and not force_refresh:
+            age = time.time() - entry[2]
+            if age < self.ttl:
+                with self._lock:
+                    self.hits += 1
+                return self._result(entry)
+            if age < self.ttl + self.stale_ttl:
+                with self._lock:
+                    self.stale_hits += 1
+                self._refresh_in_background()
+                return self._result(entry)
+
+        return self._fetch_now(entry, force_refresh)
+
+    def _fetch_now(self, seen_entry, force_refresh: bool) -> Dict:
+        with self._fetch_lock:
+            # Another caller may have fetched while we waited for the lock
+            if self._entry is not seen_entry and self._entry is not None:
+                return self._result(self._entry)
+            result = self._fetch()
+            if result["status"] == "success":
+                return self._result(self._entry)
+            if self._entry and not force_refresh and time.time() - self._entry[2] < self.ttl + self.stale_ttl:
+                return self._result(self._entry)
+            return result
+
+    def _fetch(self) -> Dict:
+        with self._lock:
+            self.fetches += 1
+        try:
+            result = self.fetch()
+        except Exception as e:
+            result = {"status": "error", "message": f"Error getting models: {str(e)}"}
+        if result["status"] == "success":
+            models = result["models"]
+            self._entry = (models, models_etag(models), time.time())
+        else:
+            with self._lock:
+                self.failures += 1
+                self.last_error = result.get("message")
+        return result
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self.background_refreshes += 1
+        threading.Thread(target=self._background_refresh, name="models-catalog-refresh", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            with self._fetch_lock:
+                self._fetch()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _result(self, entry) -> Dict:
+        models, etag, fetched_at = entry
+        age = time.time() - fetched_at
+        return {
+            "status": "success",
+            "models": models,
+            "etag": etag,
+            "age": age,
+            "max_age": max(int(self.ttl - age), 0)
+        }
+
+    def invalidate(self):
+        """Forget the cached catalog so the next call fetches it again"""
+        self._entry = None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            entry = self._entry
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "fetches": self.fetches,
+                "background_refreshes": self.background_refreshes,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "age": time.time() - entry[2] if entry else None
+            }
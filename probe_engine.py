@@ -0,0 +1,133 @@
+"""
+Concurrent HTTP probe engine shared by the endpoint diagnostic scripts
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+from config import PROBE_MAX_WORKERS, PROBE_TIMEOUT, PROBE_DEADLINE, HTTP_POOL_CONNECTIONS
+from http_pool import PooledSession
+
+# How much of each response body is kept in results and reports
+PREVIEW_CHARS = 200
+
+
+def make_probe(name: str, url: str, method: str = "GET", headers: Optional[Dict] = None,
+               json_body: Optional[Dict] = None, **tags) -> Dict:
+    """Describe one request to probe; extra keyword arguments are copied to its result"""
+    return {"name": name, "method": method, "url": url, "headers": headers or {}, "json": json_body, "tags": tags}
+
+
+class ProbeEngine:
+    """Runs a list of probes on a bounded thread pool over pooled keep-alive connections.
+
+    ``run`` yields each result as soon as it finishes. Every request's timeout
+    is clamped to what is left of the global ``deadline``; when it passes,
+    unfinished probes are reported as ``"timeout"`` and ones that never
+    started as ``"skipped"``, so a run takes at most about ``deadline``
+    seconds however many probes there are.
+    """
+
+    def __init__(self, max_workers: int = PROBE_MAX_WORKERS, timeout: float = PROBE_TIMEOUT,
+                 deadline: float = PROBE_DEADLINE, session: Optional[PooledSession] = None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.deadline = deadline
+        # One host pool per worker, so probing many hosts at once never evicts a pool mid-run
+        self.http = session or PooledSession(pool_connections=max(HTTP_POOL_CONNECTIONS, max_workers),
+                                             pool_maxsize=max_workers)
+
+    def _probe(self, probe: Dict, deadline_at: float) -> Dict:
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            return self._result(probe, "skipped", error="Global deadline reached before the probe started")
+
+        started = time.monotonic()
+        try:
+            response = self.http.request(probe["method"], probe["url"], headers=probe["headers"],
+                                         json=probe["json"], timeout=min(self.timeout, remaining))
+        except requests.exceptions.Timeout:
+            return self._result(probe, "timeout", elapsed=time.monotonic() - started, error="Timeout")
+        except requests.exceptions.RequestException as e:
+            return self._result(probe, "error", elapsed=time.monotonic() - started, error=str(e))
+
+        content_type = response.headers.get("content-type", "")
+        result = self._result(
+            probe, "ok",
+            elapsed=time.monotonic() - started,
+            status_code=response.status_code,
+            content_type=content_type,
+            body_preview=response.text[:PREVIEW_CHARS]
+        )
+        if "application/json" in content_type:
+            try:
+                result["response_json"] = response.json()
+            except ValueError:
+                pass
+        return result
+
+    @staticmethod
+    def _result(probe: Dict, outcome: str, **fields) -> Dict:
+        result = {
+            "name": probe["name"],
+            "method": probe["method"],
+            "url": probe["url"],
+            "outcome": outcome,
+            "status_code": None,
+            "content_type": None,
+            "elapsed": None,
+            "body_preview": None,
+            "error": None
+        }
+        result.update(probe["tags"])
+        result.update(fields)
+        return result
+
+    def run(self, probes: List[Dict]) -> Iterator[Dict]:
+        """Run probes concurrently, yielding results in completion order"""
+        deadline_at = time.monotonic() + self.deadline
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="probe")
+        futures = {executor.submit(self._probe, probe, deadline_at): probe for probe in probes}
+        try:
+            # A little grace after the deadline so requests cut off by their clamped timeout still report
+            for future in as_completed(futures, timeout=max(self.deadline, 0) + 1):
+                yield future.result()
+        except FuturesTimeout:
+            for future, probe in futures.items():
+                if not future.done():
+                    outcome = "skipped" if future.cancel() else "timeout"
+                    yield self._result(probe, outcome, error="Global deadline reached")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        self.http.close()
+
+
+def summarize(results: List[Dict]) -> Dict:
+    """Counts of results by outcome and by HTTP status"""
+    by_outcome: Dict[str, int] = {}
+    by_status: Dict[str, int] = {}
+    for result in results:
+        by_outcome[result["outcome"]] = by_outcome.get(result["outcome"], 0) + 1
+        if result["status_code"] is not None:
+            key = str(result["status_code"])
+            by_status[key] = by_status.get(key, 0) + 1
+    return {"total": len(results), "by_outcome": by_outcome, "by_status": by_status}
+
+
+def write_report(path: str, results: List[Dict], elapsed: float, **meta):
+    """Write results plus a summary as a JSON report"""
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "elapsed": elapsed,
+        **meta,
+        "summary": summarize(results),
+        "results": results
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
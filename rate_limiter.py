@@ -0,0 +1,193 @@
+"""
+Client-side token-bucket rate limiting aligned with APIM subscription quotas
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+from config import RATE_LIMIT_RPS, RATE_LIMIT_TPM, RATE_LIMIT_MAX_WAIT, RATE_LIMIT_STATE_FILE
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a request would have to wait longer than the limiter allows"""
+
+
+def estimate_request_tokens(payload: Dict) -> int:
+    """Rough token estimate for a chat payload: ~4 characters per token plus the completion budget"""
+    chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages", []))
+    return chars // 4 + len(payload.get("messages", [])) * 4 + int(payload.get("max_tokens", 0))
+
+
+class LocalBackend:
+    """Bucket state shared by the threads of one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: Dict = {}
+
+    @contextlib.contextmanager
+    def state(self) -> Iterator[Dict]:
+        with self._lock:
+            yield self._state
+
+
+class FileBackend:
+    """Bucket state in a lock-protected JSON file shared by several worker processes"""
+
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError("The shared-file rate limit backend requires fcntl (POSIX)")
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def state(self) -> Iterator[Dict]:
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                raw = b""
+                while True:
+                    chunk = os.read(fd, 4096)
+                    if not chunk:
+                        break
+                    raw += chunk
+                try:
+                    state = json.loads(raw) if raw else {}
+                except ValueError:
+                    state = {}
+                yield state
+                data = json.dumps(state).encode("utf-8")
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, data)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+
+class RateLimiter:
+    """Two token buckets: requests per second and (estimated) model tokens per minute.
+
+    ``acquire`` reserves capacity up front and lets the bucket go negative, so
+    the returned wait is the caller's place in the queue. If that wait would
+    exceed ``max_wait`` nothing is reserved and RateLimitTimeout is raised
+    instead of sending a request the gateway will reject with 429.
+    """
+
+    def __init__(self,
+                 requests_per_second: float = RATE_LIMIT_RPS,
+                 tokens_per_minute: float = RATE_LIMIT_TPM,
+                 max_wait: float = RATE_LIMIT_MAX_WAIT,
+                 state_file: Optional[str] = RATE_LIMIT_STATE_FILE):
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute = tokens_per_minute
+        self.max_wait = max_wait
+        self.backend = FileBackend(state_file) if state_file else LocalBackend()
+
+        self._stats_lock = threading.Lock()
+        self.acquired = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests_per_second > 0 or self.tokens_per_minute > 0
+
+    def _buckets(self):
+        """(name, capacity, refill per second) for each active bucket"""
+        buckets = []
+        if self.requests_per_second > 0:
+            buckets.append(("requests", max(self.requests_per_second, 1.0), self.requests_per_second))
+        if self.tokens_per_minute > 0:
+            buckets.append(("tokens", self.tokens_per_minute, self.tokens_per_minute / 60.0))
+        return buckets
+
+    @staticmethod
+    def _refill(state: Dict, name: str, capacity: float, rate: float, now: float) -> float:
+        level = state.get(f"{name}_level", capacity)
+        updated = state.get(f"{name}_updated", now)
+        level = min(capacity, level + (now - updated) * rate)
+        state[f"{name}_updated"] = now
+        return level
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Reserve one request and ``tokens`` model tokens, sleeping until they are available"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Like acquire, but return the wait instead of sleeping (asyncio callers await it themselves)"""
+        if not self.enabled:
+            return 0.0
+
+        costs = {"requests": 1, "tokens": tokens}
+        with self.backend.state() as state:
+            now = time.time()
+            levels = {}
+            wait = 0.0
+            for name, capacity, rate in self._buckets():
+                level = self._refill(state, name, capacity, rate, now)
+                # A single cost larger than the bucket can never fit; let it through at full capacity
+                cost = min(costs[name], capacity)
+                levels[name] = level - cost
+                if levels[name] < 0:
+                    wait = max(wait, -levels[name] / rate)
+
+            if wait > self.max_wait:
+                # Persist the refilled levels but reserve nothing
+                for name, capacity, _ in self._buckets():
+                    state[f"{name}_level"] = levels[name] + min(costs[name], capacity)
+                with self._stats_lock:
+                    self.rejected += 1
+                raise RateLimitTimeout(f"Client-side rate limit: request would wait {wait:.1f}s "
+                                       f"(max {self.max_wait:.1f}s)")
+
+            for name in levels:
+                state[f"{name}_level"] = levels[name]
+
+        with self._stats_lock:
+            self.acquired += 1
+            if wait > 0:
+                self.delayed += 1
+                self.total_wait += wait
+        return wait
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Correct the token bucket once the real usage of a request is known.
+
+        ``estimated_tokens`` is what was passed to acquire; only the part that
+        was charged (at most the bucket capacity) is given back.
+        """
+        if not self.tokens_per_minute or actual_tokens is None:
+            return
+        with self.backend.state() as state:
+            capacity = self.tokens_per_minute
+            charged = min(estimated_tokens, capacity)
+            level = self._refill(state, "tokens", capacity, capacity / 60.0, time.time())
+            state["tokens_level"] = min(capacity, level + charged - actual_tokens)
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "enabled": self.enabled,
+                "requests_per_second": self.requests_per_second,
+                "tokens_per_minute": self.tokens_per_minute,
+                "acquired": self.acquired,
+                "delayed": self.delayed,
+                "rejected": self.rejected,
+                "avg_wait": self.total_wait / self.delayed if self.delayed else 0.0,
+                "backend": type(self.backend).__name__
+            }
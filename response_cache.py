@@ -0,0 +1,184 @@
+"""
+Exact-match cache for chat completion responses
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import json_codec
+from config import (RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_DB,
+                    RESPONSE_CACHE_DETERMINISTIC_ONLY)
+
+# Payload fields that do not change the completion and so are left out of the key
+IGNORED_FIELDS = ("stream", "user")
+
+
+def canonical_payload_key(payload: Dict) -> str:
+    """SHA-256 of the payload serialized with sorted keys and no whitespace"""
+    canonical = {k: v for k, v in payload.items() if k not in IGNORED_FIELDS}
+    return hashlib.sha256(json_codec.dumps(canonical, sort_keys=True)).hexdigest()
+
+
+class MemoryTier:
+    """LRU of encoded responses bounded by entry count and total bytes"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: str, now: float) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, expires_at: float):
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, value)
+        self.bytes += len(value)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        _, value = self._entries.pop(key)
+        self.bytes -= len(value)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteTier:
+    """On-disk tier so cached responses survive restarts and are shared between workers"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._pid = None
+        self._connection = None
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # SQLite connections must not cross fork(), so each worker process opens its own
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key: str, value: str, expires_at: float):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at)
+        )
+        self._conn.commit()
+
+    def purge_expired(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        self._conn.commit()
+
+
+class ResponseCache:
+    """Two-tier (memory LRU, optional SQLite) cache keyed on the canonical chat payload.
+
+    With ``deterministic_only`` (the default) only requests sent with
+    temperature 0 are cached, since other settings are expected to vary.
+    """
+
+    def __init__(self,
+                 ttl: float = RESPONSE_CACHE_TTL,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+                 db_path: Optional[str] = RESPONSE_CACHE_DB,
+                 deterministic_only: bool = RESPONSE_CACHE_DETERMINISTIC_ONLY):
+        self.ttl = ttl
+        self.deterministic_only = deterministic_only
+        self._lock = threading.Lock()
+        self.memory = MemoryTier(max_entries, max_bytes)
+        self.disk = SQLiteTier(db_path) if db_path else None
+        if self.disk:
+            self.disk.purge_expired(time.time())
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def is_cacheable(self, payload: Dict) -> bool:
+        if not self.deterministic_only:
+            return True
+        return payload.get("temperature") == 0
+
+    def get(self, payload: Dict, key: Optional[str] = None) -> Optional[Dict]:
+        """Return the cached response for this payload, if any.
+
+        ``key`` is the payload's canonical_payload_key, if the caller already has it.
+        """
+        if not self.is_cacheable(payload):
+            with self._lock:
+                self.skipped += 1
+            return None
+
+        key = key or canonical_payload_key(payload)
+        now = time.time()
+        with self._lock:
+            value = self.memory.get(key, now)
+            if value is None and self.disk:
+                row = self.disk.get(key, now)
+                if row:
+                    value, expires_at = row
+                    self.memory.set(key, value, expires_at)
+                    self.disk_hits += 1
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json_codec.loads(value)
+
+    def set(self, payload: Dict, response_data: Dict, key: Optional[str] = None):
+        """Store a successful response for this payload"""
+        if not self.is_cacheable(payload):
+            return
+        key = key or canonical_payload_key(payload)
+        value = json_codec.dumps(response_data).decode("utf-8")
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self.memory.set(key, value, expires_at)
+            if self.disk:
+                self.disk.set(key, value, expires_at)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.memory),
+                "bytes": self.memory.bytes,
+                "disk": self.disk.path if self.disk else None
+            }
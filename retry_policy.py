@@ -0,0 +1,90 @@
+"""
+Retry policy with capped exponential backoff, jitter and Retry-After support
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, Optional
+
+from config import RETRY_MAX_RETRIES, RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX, RETRY_STATUS_CODES, REQUEST_DEADLINE
+
+# Throttled or refused before reaching the backend. A 502/504 can arrive after the backend
+# already ran the request, so POSTs are not resent for those
+UNPROCESSED_STATUSES = frozenset({429, 503})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Decides whether and how long to wait before retrying a request.
+
+    Delays use "full jitter" exponential backoff: a random value between 0 and
+    ``min(backoff_max, backoff_base * 2 ** attempt)``. A server-provided
+    Retry-After takes precedence. No retry is scheduled if it would push the
+    request past its deadline.
+    """
+
+    def __init__(self,
+                 max_retries: int = RETRY_MAX_RETRIES,
+                 backoff_base: float = RETRY_BACKOFF_BASE,
+                 backoff_max: float = RETRY_BACKOFF_MAX,
+                 retry_statuses: Iterable[int] = RETRY_STATUS_CODES,
+                 deadline: float = REQUEST_DEADLINE):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self.deadline = deadline
+
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.gave_up = 0
+
+    def should_retry_status(self, status_code: int, idempotent: bool = True) -> bool:
+        """A non-idempotent request is only resent for statuses that say it was not processed"""
+        if not idempotent and status_code not in UNPROCESSED_STATUSES:
+            return False
+        return status_code in self.retry_statuses
+
+    def backoff(self, attempt: int) -> float:
+        """Jittered exponential backoff for the given (0-based) retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def next_delay(self, attempt: int, deadline_at: float, retry_after: Optional[str] = None) -> Optional[float]:
+        """Seconds to wait before retry number ``attempt``, or None to stop retrying"""
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            delay = self.backoff(attempt)
+
+        if attempt >= self.max_retries or time.monotonic() + delay >= deadline_at:
+            with self._lock:
+                self.gave_up += 1
+            return None
+
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "gave_up": self.gave_up,
+                "max_retries": self.max_retries,
+                "deadline": self.deadline
+            }
@@ -6,6 +6,7 @@ Startup script for LLAMA LLM Chat Application
 import sys
 import subprocess
 import os
+import argparse
 
 def print_banner():
     """Print application banner"""
@@ -34,6 +35,14 @@ def print_options():
     print("4. 📋 Show Configuration")
     print("   - Display current settings")
     print()
+    print("5. 🏭 Start Flask Backend (Production)")
+    print("   - Multi-process, multi-threaded gunicorn server")
+    print("   - Available at: http://localhost:5000")
+    print()
+    print("6. ⚡ Start Async Backend")
+    print("   - Same API on aiohttp, for many long-lived chats")
+    print("   - Available at: http://localhost:5000")
+    print()
     print("0. ❌ Exit")
     print()
 
@@ -44,6 +53,8 @@ def start_flask_backend():
     print("🔧 API endpoints:")
     print("   - POST /api/test-connection")
     print("   - POST /api/chat")
+    print("   - POST /api/chat/stream")
+    print("   - GET/DELETE /api/conversations/<id>")
     print("   - GET  /api/models")
     print("   - GET  /api/health")
     print()
@@ -57,6 +68,52 @@ def start_flask_backend():
     except Exception as e:
         print(f"❌ Error starting server: {e}")
 
+def start_production_server(workers=None, threads=None, bind=None, backlog=None):
+    """Serve the Flask app through gunicorn with several worker processes"""
+    from config import SERVER_BIND, SERVER_WORKERS, SERVER_THREADS, SERVER_BACKLOG
+    
+    workers = workers or SERVER_WORKERS
+    threads = threads or SERVER_THREADS
+    bind = bind or SERVER_BIND
+    backlog = backlog or SERVER_BACKLOG
+    
+    print("🏭 Starting Flask Backend (Production)...")
+    print(f"📱 Frontend will be available at: http://{bind}")
+    print(f"⚙️  Workers: {workers} x {threads} threads, backlog {backlog}")
+    print("🔄 Graceful restart: kill -HUP <master pid>")
+    print()
+    print("Press Ctrl+C to stop the server")
+    print("=" * 50)
+    
+    # Worker processes do not share memory, so keep conversations in SQLite unless configured otherwise
+    env = dict(os.environ)
+    env.setdefault("CONVERSATION_STORE", "sqlite")
+    
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "--config", "gunicorn.conf.py",
+        "--workers", str(workers),
+        "--threads", str(threads),
+        "--bind", bind,
+        "--backlog", str(backlog)
+    ]
+    
+    try:
+        subprocess.run(command, check=True, env=env)
+    except KeyboardInterrupt:
+        print("\n👋 Server stopped by user")
+    except Exception as e:
+        print(f"❌ Error starting server: {e}")
+
+def start_async_backend():
+    """Start the async (aiohttp) backend server"""
+    try:
+        subprocess.run([sys.executable, "async_app.py"], check=True)
+    except KeyboardInterrupt:
+        print("\n👋 Server stopped by user")
+    except Exception as e:
+        print(f"❌ Error starting server: {e}")
+
 def start_streamlit_app():
     """Start the Streamlit app"""
     print("📱 Starting Streamlit App...")
@@ -114,7 +171,9 @@ def check_dependencies():
         'python-dotenv': 'dotenv',  # python-dotenv installs as 'dotenv'
         'streamlit': 'streamlit',
         'flask': 'flask',
-        'flask-cors': 'flask_cors'
+        'flask-cors': 'flask_cors',
+        'aiohttp': 'aiohttp',
+        'gunicorn': 'gunicorn'
     }
     
     missing_packages = []
@@ -139,8 +198,22 @@ def check_dependencies():
     print()
     return True
 
+def parse_args():
+    """Parse non-interactive command line options"""
+    parser = argparse.ArgumentParser(description="Start the LLAMA LLM Chat Application")
+    parser.add_argument("--production", action="store_true",
+                        help="Serve the Flask backend with gunicorn instead of showing the menu")
+    parser.add_argument("--async-server", action="store_true",
+                        help="Serve the async (aiohttp) backend instead of showing the menu")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (production)")
+    parser.add_argument("--threads", type=int, help="Threads per worker (production)")
+    parser.add_argument("--bind", help="Address to listen on, e.g. 0.0.0.0:5000 (production)")
+    parser.add_argument("--backlog", type=int, help="Listen backlog (production)")
+    return parser.parse_args()
+
 def main():
     """Main function"""
+    args = parse_args()
     print_banner()
     
     # Check dependencies first
@@ -148,11 +221,18 @@ def main():
         print("Please install missing dependencies and try again.")
         return
     
+    if args.production:
+        start_production_server(args.workers, args.threads, args.bind, args.backlog)
+        return
+    if args.async_server:
+        start_async_backend()
+        return
+    
     while True:
         print_options()
         
         try:
-            choice = input("Enter your choice (0-4): ").strip()
+            choice = input("Enter your choice (0-6): ").strip()
             
             if choice == "1":
                 start_flask_backend()
@@ -166,11 +246,17 @@ def main():
             elif choice == "4":
                 show_configuration()
                 input("\nPress Enter to continue...")
+            elif choice == "5":
+                start_production_server()
+                break
+            elif choice == "6":
+                start_async_backend()
+                break
             elif choice == "0":
                 print("👋 Goodbye!")
                 break
             else:
-                print("❌ Invalid choice. Please enter 0-4.")
+                print("❌ Invalid choice. Please enter 0-6.")
                 input("Press Enter to continue...")
                 
         except KeyboardInterrupt:
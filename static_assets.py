@@ -0,0 +1,171 @@
+"""
+Precompressed, fingerprinted static assets for the frontend
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Files that are worth compressing; images and fonts are already compressed
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+# Fingerprinted URLs never change content, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Everything else (index.html, unhashed names) is revalidated with its ETag on each use
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# href="name" / src="name" references to local files in the HTML entry page
+ASSET_REFERENCE = re.compile(r'(href|src)="([^":/?#]+\.[A-Za-z0-9]+)"')
+
+
+class StaticAsset:
+    """One file with its encodings and the ETag of each"""
+
+    def __init__(self, name: str, body: bytes, immutable: bool = False):
+        self.name = name
+        self.immutable = immutable
+        self.content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if self.content_type.startswith("text/") or self.content_type == "application/javascript":
+            self.content_type += "; charset=utf-8"
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.encodings: Dict[str, bytes] = {"identity": body}
+
+        if any(self.content_type.startswith(t) for t in COMPRESSIBLE_TYPES):
+            # mtime=0 keeps the gzip bytes (and so the ETag) identical across restarts and workers
+            self._add_encoding("gzip", gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._add_encoding("br", brotli.compress(body, quality=11))
+
+    def _add_encoding(self, encoding: str, compressed: bytes):
+        if len(compressed) < len(self.encodings["identity"]):
+            self.encodings[encoding] = compressed
+
+    @property
+    def fingerprinted_name(self) -> str:
+        root, ext = os.path.splitext(self.name)
+        return f"{root}.{self.digest[:10]}{ext}"
+
+    @property
+    def cache_control(self) -> str:
+        return IMMUTABLE_CACHE_CONTROL if self.immutable else REVALIDATE_CACHE_CONTROL
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}-{encoding}"'
+
+    def select(self, accept_encoding: Optional[str]) -> Tuple[str, bytes]:
+        """Pick the smallest encoding the client accepts; returns (encoding, body)"""
+        accepted = parse_accept_encoding(accept_encoding)
+        best = "identity"
+        for encoding in self.encodings:
+            if encoding != "identity" and accepted.get(encoding, accepted.get("*", 0)) > 0:
+                if len(self.encodings[encoding]) < len(self.encodings[best]):
+                    best = encoding
+        return best, self.encodings[best]
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value"""
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+class StaticAssets:
+    """Loads a directory once at startup.
+
+    Every file is reachable under its own name (revalidated) and under a
+    content-hashed name (cached forever). References to local files in
+    ``index.html`` are rewritten to the hashed names, so a deploy only makes
+    browsers download the files that actually changed.
+    """
+
+    def __init__(self, directory: str, entry_page: str = "index.html"):
+        self.directory = directory
+        self.entry_page = entry_page
+        self._assets: Dict[str, StaticAsset] = {}
+
+        files = {}
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, directory).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    files[rel] = f.read()
+
+        for rel, body in files.items():
+            if rel == entry_page:
+                continue
+            asset = StaticAsset(rel, body)
+            self._assets[rel] = asset
+            self._assets[asset.fingerprinted_name] = StaticAsset(rel, body, immutable=True)
+
+        if entry_page in files:
+            html = files[entry_page].decode("utf-8")
+            html = ASSET_REFERENCE.sub(self._fingerprint_reference, html)
+            self._assets[entry_page] = StaticAsset(entry_page, html.encode("utf-8"))
+
+    def _fingerprint_reference(self, match) -> str:
+        attr, name = match.groups()
+        asset = self._assets.get(name)
+        if asset is None:
+            return match.group(0)
+        return f'{attr}="{asset.fingerprinted_name}"'
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        return self._assets.get(name)
+
+    def respond(self, name: str, accept_encoding: Optional[str],
+                if_none_match: Optional[str]) -> Optional[Tuple[int, bytes, Dict[str, str]]]:
+        """Return (status, body, headers) for a request, or None if there is no such asset"""
+        asset = self.get(name)
+        if asset is None:
+            return None
+
+        encoding, body = asset.select(accept_encoding)
+        etag = asset.etag(encoding)
+        headers = {
+            "Content-Type": asset.content_type,
+            "Cache-Control": asset.cache_control,
+            "ETag": etag,
+            "Vary": "Accept-Encoding"
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if etag_matches(if_none_match, etag):
+            return 304, b"", headers
+        return 200, body, headers
@@ -0,0 +1,290 @@
+"""
+Process-wide Azure AD token provider shared by all LlamaClient instances
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import msal
+import requests
+
+from config import (TOKEN_CACHE_FILE, TOKEN_ENDPOINT, TOKEN_REFRESH_AHEAD, TOKEN_REFRESH_FRACTION,
+                    TOKEN_REFRESH_RETRY_SECONDS)
+
+# Tokens are treated as expired this many seconds before AAD says they are
+TOKEN_EXPIRY_MARGIN = 300
+
+
+class RefreshMetrics:
+    """Thread-safe counters for token refreshes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.background_refreshes = 0
+        self.failures = 0
+        self.waiters = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+        self.last_error: Optional[str] = None
+
+    def record_refresh(self, latency: float, background: bool):
+        with self._lock:
+            self.refreshes += 1
+            if background:
+                self.background_refreshes += 1
+            self.total_latency += latency
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def record_failure(self, error: str):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+
+    def record_waiter(self):
+        with self._lock:
+            self.waiters += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "refreshes": self.refreshes,
+                "background_refreshes": self.background_refreshes,
+                "refresh_failures": self.failures,
+                "waiters": self.waiters,
+                "avg_refresh_latency": self.total_latency / self.refreshes if self.refreshes else 0.0,
+                "max_refresh_latency": self.max_latency,
+                "last_refresh_latency": self.last_latency,
+                "last_error": self.last_error
+            }
+
+
+class TokenProvider:
+    """Owns one MSAL application and its token cache for a (client_id, authority, scope) key.
+
+    If ``cache_file`` is given the MSAL token cache is serialized to disk, so a
+    restarted process can reuse a still-valid token instead of calling AAD.
+
+    With ``refresh_ahead`` enabled a daemon timer renews the token once
+    ``refresh_fraction`` of its lifetime has passed, so callers normally never
+    wait on AAD. Callers that do find no valid token share a single in-flight
+    refresh instead of each starting their own.
+
+    If ``token_endpoint`` is set, tokens come from a plain OAuth2
+    client-credentials POST to that URL instead of MSAL, which only talks to
+    https authorities it can discover (the local mock gateway is neither).
+    """
+
+    def __init__(self, client_id: str, client_secret: str, authority: str,
+                 scope: Optional[List[str]], cache_file: Optional[str] = None,
+                 refresh_ahead: bool = TOKEN_REFRESH_AHEAD,
+                 refresh_fraction: float = TOKEN_REFRESH_FRACTION,
+                 token_endpoint: Optional[str] = None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.authority = authority
+        self.scopes = list(scope) if scope else []
+        self.cache_file = cache_file
+        self.refresh_ahead = refresh_ahead
+        self.refresh_fraction = refresh_fraction
+        self.token_endpoint = token_endpoint
+        self.metrics = RefreshMetrics()
+
+        # Held for the duration of a refresh; waiting on it is the single-flight
+        self._lock = threading.Lock()
+        # (access_token, usable_until) swapped as one tuple so readers never need the lock
+        self._token: Tuple[Optional[str], float] = (None, 0.0)
+        self._timer: Optional[threading.Timer] = None
+
+        self.cache = msal.SerializableTokenCache()
+        self._load_cache()
+        self._app: Optional[msal.ConfidentialClientApplication] = None
+
+    @property
+    def app(self) -> msal.ConfidentialClientApplication:
+        """The MSAL application, created on first use (construction does authority discovery)"""
+        if self._app is None:
+            self._app = msal.ConfidentialClientApplication(
+                client_id=self.client_id,
+                client_credential=self.client_secret,
+                authority=self.authority,
+                token_cache=self.cache
+            )
+        return self._app
+
+    @property
+    def access_token(self) -> Optional[str]:
+        return self._token[0]
+
+    @property
+    def expires_at(self) -> float:
+        return self._token[1]
+
+    def _load_cache(self):
+        """Load the serialized token cache from disk, ignoring unreadable files"""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                self.cache.deserialize(f.read())
+        except (OSError, ValueError):
+            pass
+
+    def _save_cache(self):
+        """Atomically write the token cache to disk if it changed"""
+        if not self.cache_file or not self.cache.has_state_changed:
+            return
+        tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.cache.serialize())
+            os.replace(tmp_path, self.cache_file)
+            self.cache.has_state_changed = False
+        except OSError:
+            pass
+
+    def is_token_valid(self) -> bool:
+        """Check if the cached token is still usable"""
+        token, usable_until = self._token
+        return bool(token) and time.time() < usable_until
+
+    def _drop_cached_access_tokens(self):
+        """Remove this client's access tokens from the MSAL cache so the next acquire hits AAD"""
+        stale = list(self.cache.find(msal.TokenCache.CredentialType.ACCESS_TOKEN,
+                                     query={"client_id": self.client_id}))
+        for entry in stale:
+            self.cache.remove_at(entry)
+
+    def _acquire(self) -> Dict:
+        """Get a token from the MSAL cache or, failing that, from AAD"""
+        if self.token_endpoint:
+            return self._acquire_from_endpoint()
+        # acquire_token_for_client consults the (possibly disk-loaded) cache first
+        result = self.app.acquire_token_for_client(scopes=self.scopes)
+        self._save_cache()
+        return result
+
+    def _acquire_from_endpoint(self) -> Dict:
+        """Client-credentials grant against ``token_endpoint``, bypassing MSAL"""
+        response = requests.post(self.token_endpoint, data={
+            "grant_type": "client_credentials",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "scope": " ".join(self.scopes)
+        }, timeout=30)
+        try:
+            return response.json()
+        except ValueError:
+            return {"error_description": f"Token endpoint returned status {response.status_code}"}
+
+    def get_token(self, force_refresh: bool = False) -> Tuple[str, float]:
+        """Return (access_token, usable_until) fetching a new token only when needed"""
+        if not force_refresh:
+            token, usable_until = self._token
+            if token and time.time() < usable_until:
+                return token, usable_until
+        return self._refresh(force=force_refresh, background=False)
+
+    def _refresh(self, force: bool, background: bool) -> Tuple[str, float]:
+        """Fetch a new token; concurrent callers wait for the refresh already in flight"""
+        if not self._lock.acquire(blocking=False):
+            self.metrics.record_waiter()
+            self._lock.acquire()
+        try:
+            # Another caller may have finished a refresh while we were waiting
+            if not force and self.is_token_valid():
+                return self._token
+
+            if force and not self.token_endpoint:
+                self._drop_cached_access_tokens()
+
+            started = time.monotonic()
+            try:
+                result = self._acquire()
+            except Exception as e:
+                self.metrics.record_failure(str(e))
+                raise
+            if "access_token" not in result:
+                error = result.get("error_description", "Unknown error")
+                self.metrics.record_failure(error)
+                raise Exception(f"Failed to get access token: {error}")
+            self.metrics.record_refresh(time.monotonic() - started, background)
+
+            lifetime = int(result.get("expires_in", 3600))
+            self._token = (result["access_token"], time.time() + lifetime - TOKEN_EXPIRY_MARGIN)
+            if self.refresh_ahead:
+                # Never schedule past the point where the token stops being usable
+                self._schedule_refresh(min(lifetime * self.refresh_fraction, lifetime - TOKEN_EXPIRY_MARGIN))
+            return self._token
+        finally:
+            self._lock.release()
+
+    def _schedule_refresh(self, delay: float):
+        """(Re)arm the background refresh timer"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(delay, 0.0), self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        """Timer callback: renew the token while the current one is still valid"""
+        try:
+            self._refresh(force=True, background=True)
+        except Exception:
+            # Failure is already counted; retry while the old token still has time left
+            remaining = self.expires_at - time.time()
+            if remaining > TOKEN_REFRESH_RETRY_SECONDS:
+                self._schedule_refresh(TOKEN_REFRESH_RETRY_SECONDS)
+
+    def get_metrics(self) -> Dict:
+        """Refresh latency and failure metrics"""
+        metrics = self.metrics.snapshot()
+        metrics.update({
+            "token_valid": self.is_token_valid(),
+            "seconds_until_expiry": max(self.expires_at - time.time(), 0.0),
+            "refresh_ahead": self.refresh_ahead
+        })
+        return metrics
+
+    def stop(self):
+        """Cancel the background refresh timer"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def prepare_for_fork(self):
+        """Stop the refresh timer and drop pooled AAD connections before worker processes fork"""
+        self.stop()
+        if self._app is not None:
+            close = getattr(self._app.http_client, "close", None)
+            if close:
+                close()
+
+    def resume_after_fork(self):
+        """Re-arm background refresh in a forked worker (timer threads do not survive fork)"""
+        if self.refresh_ahead and self.is_token_valid():
+            self._schedule_refresh((self.expires_at - time.time()) * self.refresh_fraction)
+
+
+_providers: Dict[Tuple, TokenProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_token_provider(client_id: str, client_secret: str, authority: str,
+                       scope: Optional[List[str]], cache_file: Optional[str] = TOKEN_CACHE_FILE,
+                       token_endpoint: Optional[str] = TOKEN_ENDPOINT) -> TokenProvider:
+    """Get the process-wide TokenProvider for this client, authority and scope"""
+    key = (client_id, authority, tuple(scope or ()), token_endpoint or None)
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            provider = TokenProvider(client_id, client_secret, authority, scope, cache_file or None,
+                                     token_endpoint=token_endpoint or None)
+            _providers[key] = provider
+        return provider
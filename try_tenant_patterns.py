@@ -3,36 +3,37 @@
 Try common tenant ID patterns for Munich Re
 """
 
-import msal
-from config import CLIENT_ID, CLIENT_SECRET, AUTH_URI
+import argparse
+from config import CLIENT_ID, CLIENT_SECRET, AUTH_URI, AUTH_DISCOVERY_CACHE_FILE
+from auth_discovery import AuthDiscovery
+
+# A scope every tenant knows, so only the tenant itself is being tested
+PROBE_SCOPE = "https://graph.microsoft.com/.default"
+
+def describe_result(result):
+    """Turn a discovery result into the message shown for a tenant pattern"""
+    if result["success"]:
+        return "✅ SUCCESS - Found valid tenant!"
+    error = result["message"] or "Unknown error"
+    if "AADSTS500011" in error:
+        return "❌ Resource not found in this tenant"
+    elif "AADSTS700016" in error:
+        return "❌ App not found in this tenant"
+    return f"❌ {error}"
 
 def test_tenant_pattern(pattern):
     """Test if a tenant pattern is valid"""
-    try:
-        app = msal.ConfidentialClientApplication(
-            client_id=CLIENT_ID,
-            client_credential=CLIENT_SECRET,
-            authority=f"{AUTH_URI}/{pattern}"
-        )
-        
-        # Try to get a token with a simple scope
-        result = app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
-        
-        if "access_token" in result:
-            return True, "✅ SUCCESS - Found valid tenant!"
-        else:
-            error = result.get('error_description', 'Unknown error')
-            if "AADSTS500011" in error:
-                return False, "❌ Resource not found in this tenant"
-            elif "AADSTS700016" in error:
-                return False, "❌ App not found in this tenant"
-            else:
-                return False, f"❌ {error}"
-                
-    except Exception as e:
-        return False, f"❌ Error: {str(e)}"
+    discovery = AuthDiscovery(CLIENT_ID, CLIENT_SECRET, AUTH_URI, cache_file=None)
+    result = discovery.try_candidate(pattern, PROBE_SCOPE)
+    return result["success"], describe_result(result)
 
 def main():
+    parser = argparse.ArgumentParser(description="Try common tenant ID patterns")
+    parser.add_argument("--all", action="store_true",
+                        help="Test every pattern instead of stopping at the first valid tenant")
+    parser.add_argument("--no-cache", action="store_true", help="Retry patterns that failed on earlier runs")
+    args = parser.parse_args()
+
     print("🔍 Testing Munich Re Tenant ID Patterns")
     print("=" * 50)
     
@@ -59,14 +60,26 @@ def main():
     
     valid_tenants = []
     
-    for pattern in patterns_to_test:
-        print(f"🔧 Testing: {pattern}")
-        success, message = test_tenant_pattern(pattern)
-        print(f"   {message}")
+    cache_file = None if args.no_cache else AUTH_DISCOVERY_CACHE_FILE
+    discovery = AuthDiscovery(CLIENT_ID, CLIENT_SECRET, AUTH_URI, cache_file=cache_file)
+    candidates = [(pattern, PROBE_SCOPE) for pattern in patterns_to_test]
+    skipped = 0
+    
+    for result in discovery.run(candidates, stop_on_success=not args.all):
+        if result["skipped"]:
+            skipped += 1
+            continue
+        known = " (known failure, cached)" if result["cached"] else ""
+        print(f"🔧 Testing: {result['tenant']}{known}")
+        print(f"   {describe_result(result)}")
         print()
         
-        if success:
-            valid_tenants.append(pattern)
+        if result["success"]:
+            valid_tenants.append(result["tenant"])
+    
+    if skipped:
+        print(f"⏭️  Stopped early; {skipped} remaining patterns were not tested (use --all to test them)")
+        print()
     
     print("=" * 50)
     print("📋 RESULTS")